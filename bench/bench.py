@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for mux that never touches the real system.
+
+Fake pacman, pip, flatpak, sudo and python executables (bench/stub_backend.py) are put in
+front of PATH, a fake pacman database and a local stand-in for the GitHub API are created,
+and every scenario runs over synthetic inputs of each size, once with empty caches (cold)
+and once more with the caches the first run left behind (warm).
+
+For every run the wall time, the number of subprocesses the stubs saw and the number of
+HTTP requests the stand-in server answered are reported as JSON.
+
+usage: python bench/bench.py [--sizes 10,100,1000] [--scenarios ...] [--latency-ms MS] [--output FILE]
+"""
+
+import argparse
+import base64
+import hashlib
+import http.server
+import importlib.machinery
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+# the module, code/main.py only launches it
+MUX = os.path.join(ROOT, "code", "mux.py")
+MUXCLI = os.path.join(ROOT, "code", "muxcli.py")
+
+TOOLS = ["pacman", "pip", "flatpak", "sudo", "python"]
+SCENARIOS = ["perform_action", "perform_many", "search_pkg", "apply_muxfile", "download_imports"]
+SEARCH_QUERIES = 10
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Synthetic system
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def pkg_name(i) -> str:
+    return f"bench-pkg-{i}"
+
+
+def app_id(i) -> str:
+    return f"org.bench.App{i}"
+
+
+def write_stubs(bin_dir) -> None:
+    os.makedirs(bin_dir, exist_ok=True)
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                f"#!{sys.executable}\n"
+                "import sys\n"
+                f"sys.path.insert(0, {BENCH_DIR!r})\n"
+                "from stub_backend import main\n"
+                f"main({tool!r})\n"
+            )
+        os.chmod(path, 0o755)
+
+
+def write_desc(fields) -> bytes:
+    return "".join(f"%{key}%\n{value}\n\n" for key, value in fields.items()).encode()
+
+
+def make_pacman_db(db_dir, size) -> None:
+    """A sync database with `size` packages, every other one of them installed."""
+    os.makedirs(os.path.join(db_dir, "sync"))
+    os.makedirs(os.path.join(db_dir, "local"))
+
+    with tarfile.open(os.path.join(db_dir, "sync", "core.db"), "w:gz") as db:
+        for i in range(size):
+            data = write_desc({
+                "NAME": pkg_name(i),
+                "VERSION": "1.1-1",
+                "DESC": f"synthetic benchmark package {i}",
+                "CSIZE": 1024 * (i + 1),
+            })
+            info = tarfile.TarInfo(f"{pkg_name(i)}-1.1-1/desc")
+            info.size = len(data)
+            db.addfile(info, io.BytesIO(data))
+
+    for i in range(0, size, 2):
+        entry = os.path.join(db_dir, "local", f"{pkg_name(i)}-1.0-1")
+        os.makedirs(entry)
+        with open(os.path.join(entry, "desc"), "wb") as f:
+            f.write(write_desc({"NAME": pkg_name(i), "VERSION": "1.0-1"}))
+
+
+def make_muxfile(path, size) -> None:
+    """A muxFile mixing every entry type: mostly pacman, then pip, flatpak and git."""
+    packages = []
+    for i in range(size):
+        kind = i % 20
+        if kind == 0:
+            packages.append({"type": "git", "repo": f"https://github.com/bench/repo{i}", "file": "installer.py"})
+        elif kind <= 3:
+            packages.append({"type": "flatpak", "apps": [app_id(i)]})
+        elif kind <= 7:
+            packages.append({"type": "pip", "modules": [f"benchmod{i}"]})
+        else:
+            packages.append({"type": "pacman", "name": pkg_name(i)})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"packages": packages, "docs": "https://example.invalid/docs"}, f)
+
+
+def make_project(project_dir, size) -> None:
+    """A Python project of `size` files importing stdlib, local and third party modules."""
+    os.makedirs(project_dir)
+    for i in range(size):
+        with open(os.path.join(project_dir, f"module{i}.py"), "w", encoding="utf-8") as f:
+            f.write(
+                "import os\n"
+                "import json\n"
+                f"import benchdep{i % 25}\n"
+                "import yaml\n"
+                f"from module{(i + 1) % size} import *\n"
+                "def f():\n    return os.getcwd()\n"
+            )
+
+
+def make_environment(work, size, latency_ms, server_url) -> dict:
+    """Create the fake system for one run and return the environment to run mux in."""
+    home = os.path.join(work, "home")
+    state = os.path.join(work, "state")
+    db_dir = os.path.join(work, "pacman")
+    bin_dir = os.path.join(work, "bin")
+    os.makedirs(os.path.join(home, ".config", "mux"))
+    os.makedirs(state)
+
+    write_stubs(bin_dir)
+    make_pacman_db(db_dir, size)
+    make_muxfile(os.path.join(work, "muxFile"), size)
+    make_project(os.path.join(work, "project"), size)
+
+    with open(os.path.join(state, "flatpak.json"), "w", encoding="utf-8") as f:
+        json.dump([app_id(i) for i in range(0, size, 2)], f)
+    with open(os.path.join(state, "flatpak-catalog.json"), "w", encoding="utf-8") as f:
+        json.dump([app_id(i) for i in range(size)], f)
+
+    config = {
+        "colors": {},
+        "general": {
+            "PACKAGE_MANAGERS": [
+                {"name": "pacman", "install_flag": "-S", "remove_flag": "-R", "sudo": True},
+                {"name": "flatpak", "install_flag": "install", "remove_flag": "uninstall", "sudo": False},
+            ],
+            "update_command": {"name": "pacman", "flag": "-Sy", "sudo": True},
+            "show_warning": False,
+            "pacman_db_path": db_dir,
+            "pacman_conf": os.path.join(work, "pacman.conf"),
+            "python": os.path.join(bin_dir, "python"),
+        },
+    }
+    with open(os.path.join(home, ".config", "mux", "mux.conf"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    return dict(
+        os.environ,
+        HOME=home,
+        XDG_CACHE_HOME=os.path.join(home, ".cache"),
+        XDG_RUNTIME_DIR=os.path.join(work, "run"),
+        PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        MUX_GITHUB_API=server_url,
+        MUX_STUB_STATE=state,
+        MUX_STUB_PACMAN_DB=db_dir,
+        MUX_STUB_LATENCY_MS=str(latency_ms),
+        MUX_STUB_REAL_PYTHON=sys.executable,
+    )
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# GitHub API stand-in
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+class GitHubStandIn(http.server.BaseHTTPRequestHandler):
+    """
+    Answers every contents API request with a tiny installer script, honouring ETags.
+    The script uses one of mux's functions, like installers written for mux do.
+    """
+
+    requests_served = Counter()
+    lock = threading.Lock()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        script = b"print_color('installed', GREEN)\n"
+        etag = '"%s"' % hashlib.sha1(script).hexdigest()
+        with self.lock:
+            self.requests_served["total"] += 1
+
+        if self.headers.get("If-None-Match") == etag:
+            with self.lock:
+                self.requests_served["not_modified"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        body = json.dumps({
+            "type": "file",
+            "sha": hashlib.sha1(script).hexdigest(),
+            "content": base64.b64encode(script).decode(),
+        }).encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Running
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def run_scenario(scenario, size, work) -> None:
+    """Worker side: import mux fresh and time one scenario. Writes {"wall_s": ...}."""
+    # an extensionless copy, which git installers must still be able to load mux from
+    lib = os.path.join(work, "lib")
+    os.makedirs(lib, exist_ok=True)
+    path = os.path.join(lib, "mux")
+    shutil.copyfile(MUX, path)
+    shutil.copy(MUXCLI, lib)
+    sys.path.insert(0, lib)
+    loader = importlib.machinery.SourceFileLoader("mux", path)
+    spec = importlib.util.spec_from_file_location("mux", path, loader=loader)
+    mux = importlib.util.module_from_spec(spec)
+    # registered so process pool workers can find mux's functions by name
+    sys.modules["mux"] = mux
+    spec.loader.exec_module(mux)
+
+    status = None
+    start = time.perf_counter()
+    if scenario == "perform_action":
+        for i in range(size):
+            mux.perform_action("install", pkg_name(i), refresh=False)
+    elif scenario == "perform_many":
+        mux.perform_many("install", [pkg_name(i) for i in range(size)], refresh=False, assume_yes=True)
+    elif scenario == "search_pkg":
+        for i in range(SEARCH_QUERIES):
+            mux.search_pkg(pkg_name(i * size // SEARCH_QUERIES))
+    elif scenario == "apply_muxfile":
+        status = mux.apply_muxfile(os.path.join(work, "muxFile"), assume_yes=True)
+    elif scenario == "download_imports":
+        mux.download_imports(os.path.join(work, "project"))
+    wall = time.perf_counter() - start
+
+    with open(os.path.join(work, "result.json"), "w", encoding="utf-8") as f:
+        json.dump({"wall_s": wall, "exit_status": status}, f)
+
+
+def count_calls(state) -> Counter:
+    calls = Counter()
+    try:
+        with open(os.path.join(state, "calls.log"), encoding="utf-8") as f:
+            for line in f:
+                calls[json.loads(line)[0]] += 1
+    except OSError:
+        pass
+    return calls
+
+
+def measure(scenario, size, work, env) -> dict:
+    state = env["MUX_STUB_STATE"]
+    log_path = os.path.join(state, "calls.log")
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    GitHubStandIn.requests_served.clear()
+
+    subprocess.run(
+        [sys.executable, __file__, "--worker", scenario, str(size), work],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    with open(os.path.join(work, "result.json"), encoding="utf-8") as f:
+        result = json.load(f)
+
+    calls = count_calls(state)
+    return {
+        "wall_s": round(result["wall_s"], 4),
+        "exit_status": result["exit_status"],
+        "subprocesses": sum(calls.values()),
+        "subprocesses_by_tool": dict(sorted(calls.items())),
+        "http_requests": GitHubStandIn.requests_served["total"],
+        "http_not_modified": GitHubStandIn.requests_served["not_modified"],
+    }
+
+
+def main() -> int:
+    if len(sys.argv) == 5 and sys.argv[1] == "--worker":
+        run_scenario(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="delay of every stub call")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), GitHubStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    results = []
+    try:
+        for scenario in scenarios:
+            for size in sizes:
+                work = tempfile.mkdtemp(prefix="mux-bench-")
+                try:
+                    env = make_environment(work, size, args.latency_ms, server_url)
+                    for run in ("cold", "warm"):
+                        row = {"scenario": scenario, "size": size, "run": run}
+                        row.update(measure(scenario, size, work, env))
+                        results.append(row)
+                        print(
+                            f"{scenario:<17} {size:>5} {run:<4} {row['wall_s']:>8.3f}s "
+                            f"{row['subprocesses']:>5} procs {row['http_requests']:>4} http",
+                            file=sys.stderr,
+                        )
+                finally:
+                    shutil.rmtree(work, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+    report = {
+        "python": sys.version.split()[0],
+        "latency_ms": args.latency_ms,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
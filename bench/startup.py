@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Startup-time budget for the mux CLI.
+
+Runs `mux help` and fails when
+  * a module that short commands must not need shows up in `python -X importtime`, or
+  * the median startup time on top of a bare interpreter exceeds the budget.
+
+usage: python bench/startup.py [--runs N] [--budget-ms MS] [--json]
+"""
+
+import argparse
+import json
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MUX = os.path.join(ROOT, "code", "main.py")
+MODULES = [os.path.join(ROOT, "code", name) for name in ("mux.py", "muxcli.py")]
+CONFIG = os.path.join(ROOT, "code", "config.conf")
+
+# Modules only specific commands need. Importing any of them for `mux help` is a regression.
+FORBIDDEN = [
+    "requests",
+    "urllib3",
+    "asyncio",
+    "sqlite3",
+    "tarfile",
+    "ast",
+    "pty",
+    "termios",
+    "subprocess",
+    "concurrent.futures",
+    "importlib.metadata",
+    "sysconfig",
+]
+
+DEFAULT_BUDGET_MS = 30.0
+
+
+def imported_modules(cmd, env) -> dict:
+    """Return {module: (cumulative import time in us, nesting depth)} from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *cmd],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        depth = len(name) - len(name.lstrip()) - 1
+        modules[name.strip()] = (int(cumulative), depth)
+    return modules
+
+
+def median_runtime(cmd, env, runs) -> float:
+    """Median wall time in milliseconds of running cmd with the current interpreter."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *cmd], env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    # the installer ships the modules compiled, so startup never includes compiling them
+    for module in MODULES:
+        py_compile.compile(module, doraise=True)
+
+    with tempfile.TemporaryDirectory() as home:
+        # a fresh home with the default config, so the result doesn't depend on the machine
+        os.makedirs(os.path.join(home, ".config", "mux"))
+        shutil.copy(CONFIG, os.path.join(home, ".config", "mux", "mux.conf"))
+        env = dict(os.environ, HOME=home, XDG_CACHE_HOME=os.path.join(home, ".cache"))
+
+        baseline = imported_modules(["-c", "pass"], env)
+        modules = imported_modules([MUX, "help"], env)
+        extra = {name: value for name, value in modules.items() if name not in baseline}
+
+        bare_ms = median_runtime(["-c", "pass"], env, args.runs)
+        mux_ms = median_runtime([MUX, "help"], env, args.runs)
+
+    overhead_ms = mux_ms - bare_ms
+    forbidden = sorted(
+        name for name in extra if any(name == f or name.startswith(f + ".") for f in FORBIDDEN)
+    )
+    ok = not forbidden and overhead_ms <= args.budget_ms
+
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "bare_interpreter_ms": round(bare_ms, 2),
+        "mux_help_ms": round(mux_ms, 2),
+        "overhead_ms": round(overhead_ms, 2),
+        "budget_ms": args.budget_ms,
+        "extra_modules": len(extra),
+        # nested imports are already part of their parent's cumulative time
+        "extra_import_ms": round(sum(us for us, depth in extra.values() if depth == 0) / 1000, 2),
+        "forbidden_imports": forbidden,
+        "ok": ok,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"bare interpreter : {report['bare_interpreter_ms']} ms")
+        print(f"mux help         : {report['mux_help_ms']} ms")
+        print(f"overhead         : {report['overhead_ms']} ms (budget {args.budget_ms} ms)")
+        print(f"extra modules    : {report['extra_modules']}")
+        if forbidden:
+            print(f"forbidden imports: {', '.join(forbidden)}")
+        print("OK" if ok else "FAIL")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    exit(main())
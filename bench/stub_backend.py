@@ -0,0 +1,229 @@
+"""
+Fake package manager executables for the benchmark suite.
+
+bench/bench.py writes one small launcher per tool (pacman, pip, flatpak, sudo, python)
+into a bin directory that calls main() with the tool's name. Every call is appended to
+$MUX_STUB_STATE/calls.log and delayed by $MUX_STUB_LATENCY_MS, the installed state lives in
+files under $MUX_STUB_STATE and in the fake pacman database at $MUX_STUB_PACMAN_DB.
+
+Names starting with "broken-" always fail to install, to exercise mux's retry paths.
+"""
+
+import json
+import os
+import sys
+import time
+
+STATE = os.environ.get("MUX_STUB_STATE", "")
+PACMAN_DB = os.environ.get("MUX_STUB_PACMAN_DB", "")
+LATENCY_MS = float(os.environ.get("MUX_STUB_LATENCY_MS", "0"))
+REAL_PYTHON = os.environ.get("MUX_STUB_REAL_PYTHON", sys.executable)
+
+
+def log_call(tool, args) -> None:
+    with open(os.path.join(STATE, "calls.log"), "a", encoding="utf-8") as f:
+        f.write(json.dumps([tool, *args]) + "\n")
+
+
+def load_set(name) -> set:
+    try:
+        with open(os.path.join(STATE, f"{name}.json"), encoding="utf-8") as f:
+            return set(json.load(f))
+    except OSError:
+        return set()
+
+
+def save_set(name, items) -> None:
+    with open(os.path.join(STATE, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(sorted(items), f)
+
+
+def names_of(args) -> list:
+    return [a for a in args if not a.startswith("-")]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# pacman: the local database directory is the installed state
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def pacman_installed() -> dict:
+    local = os.path.join(PACMAN_DB, "local")
+    installed = {}
+    for entry in os.listdir(local):
+        if os.path.isdir(os.path.join(local, entry)):
+            name, version, release = entry.rsplit("-", 2)
+            installed[name] = f"{version}-{release}"
+    return installed
+
+
+def pacman_add(name, version="1.0-1") -> None:
+    entry = os.path.join(PACMAN_DB, "local", f"{name}-{version}")
+    os.makedirs(entry, exist_ok=True)
+    with open(os.path.join(entry, "desc"), "w", encoding="utf-8") as f:
+        f.write(f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n")
+
+
+def pacman(args) -> int:
+    if not args:
+        return 1
+    op, rest = args[0], names_of(args[1:])
+    installed = pacman_installed()
+
+    if op.startswith("-Q"):
+        if not rest:
+            for name, version in sorted(installed.items()):
+                print(f"{name} {version}")
+            return 0
+        missing = [name for name in rest if name not in installed]
+        for name in rest:
+            if name in installed:
+                print(f"{name} {installed[name]}")
+        return 1 if missing else 0
+
+    if op == "-Ss":
+        for term in rest:
+            print(f"core/{term} 1.0-1")
+            print("    stub package")
+        return 0
+
+    if op.startswith("-Sy") and not rest:
+        # pretend the sync databases were refreshed
+        for name in os.listdir(os.path.join(PACMAN_DB, "sync")):
+            os.utime(os.path.join(PACMAN_DB, "sync", name))
+        return 0
+
+    if op.startswith("-S"):
+        if "-w" in op or "--downloadonly" in args:
+            return 1 if any(name.startswith("broken-") for name in rest) else 0
+        failed = False
+        for name in rest:
+            if name.startswith("broken-"):
+                failed = True
+            elif name not in installed:
+                pacman_add(name)
+        return 1 if failed else 0
+
+    if op.startswith("-R"):
+        for name in rest:
+            if name in installed:
+                os.rename(
+                    os.path.join(PACMAN_DB, "local", f"{name}-{installed[name]}"),
+                    os.path.join(STATE, f"removed-{name}"),
+                )
+        return 0
+
+    return 0
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# pip
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def pip(args) -> int:
+    if not args:
+        return 1
+    op, rest = args[0], names_of(args[1:])
+    installed = load_set("pip")
+
+    if op in ("install", "download", "wheel"):
+        if any(name.startswith("broken-") for name in rest):
+            return 1
+        if op == "install":
+            save_set("pip", installed | set(rest))
+        return 0
+
+    if op == "show":
+        return 0 if rest and all(name in installed for name in rest) else 1
+
+    if op == "list":
+        for name in sorted(installed):
+            print(f"{name} 1.0")
+        return 0
+
+    return 0
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# flatpak: installed apps also get a directory, so mux sees its state change
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def flatpak(args) -> int:
+    if not args:
+        return 1
+    op, rest = args[0], names_of(args[1:])
+    installed = load_set("flatpak")
+    catalog = load_set("flatpak-catalog")
+
+    if op == "list":
+        for app in sorted(installed):
+            print(f"{app}\tstable\tflathub\t{app.rsplit('.', 1)[-1]}")
+        return 0
+
+    if op == "remote-ls":
+        for app in sorted(catalog):
+            print(f"{app}\t{app.rsplit('.', 1)[-1]}\tstable")
+        return 0
+
+    if op == "search":
+        term = rest[0].lower() if rest else ""
+        for app in sorted(catalog):
+            if term in app.lower():
+                print(f"{app.rsplit('.', 1)[-1]}\tstub app\t{app}\t1.0\tstable\tflathub")
+        return 0
+
+    if op == "install":
+        # the first name is the remote
+        apps = rest[1:]
+        if any(app.startswith("broken-") for app in apps):
+            return 1
+        if "--no-deploy" in args:
+            # only downloaded
+            return 0
+        app_dir = os.path.join(os.path.expanduser("~/.local/share/flatpak/app"))
+        for app in apps:
+            os.makedirs(os.path.join(app_dir, app), exist_ok=True)
+        save_set("flatpak", installed | set(apps))
+        return 0
+
+    if op == "uninstall":
+        app_dir = os.path.join(os.path.expanduser("~/.local/share/flatpak/app"))
+        for app in rest:
+            if os.path.isdir(os.path.join(app_dir, app)):
+                os.rmdir(os.path.join(app_dir, app))
+        save_set("flatpak", installed - set(rest))
+        return 0
+
+    return 0
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# sudo and python hand over to the other stubs
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def sudo(args) -> int:
+    while args and args[0].startswith("-"):
+        args = args[1:]
+    if not args:
+        return 0
+    os.execvp(args[0], args)
+
+
+def python(args) -> int:
+    if args[:2] == ["-m", "pip"]:
+        return pip(args[2:])
+    os.execv(REAL_PYTHON, [REAL_PYTHON, *args])
+
+
+TOOLS = {"pacman": pacman, "pip": pip, "flatpak": flatpak, "sudo": sudo, "python": python}
+
+
+def main(tool) -> None:
+    args = sys.argv[1:]
+    log_call(tool, args)
+    if LATENCY_MS:
+        time.sleep(LATENCY_MS / 1000)
+    sys.exit(TOOLS[tool](args))
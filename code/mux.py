@@ -0,0 +1,3852 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+import json
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, TYPE_CHECKING
+
+from muxcli import (
+    DEFAULT_SETTINGS,
+    daemon_request,
+    daemon_socket_path,
+    get_config_path,
+    load_config,
+    read_command_line,
+)
+
+# Heavier modules (requests, asyncio, sqlite3, ast, pty, ...) are imported by the
+# functions that need them, so short commands like `mux help` start fast.
+if TYPE_CHECKING:
+    import sqlite3
+    import subprocess
+    import requests
+
+_config: dict | None = None
+
+
+def get_config() -> dict:
+    """The parsed config, read the first time something needs it."""
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
+
+
+def setting(name) -> Any:
+    return get_config().get("general", {}).get(name, DEFAULT_SETTINGS[name])
+
+
+def package_managers() -> list:
+    return setting("PACKAGE_MANAGERS")
+
+
+# Color names, looked up in the config's "colors" when something is printed
+GREEN = "GREEN"
+YELLOW = "YELLOW"
+RED = "RED"
+BLUE = "BLUE"
+RESET = "RESET"
+
+SUPPORTED_ACTIONS = [
+    "install",
+    "remove",
+    "update",
+    "search",
+    "find",
+    "build",
+    "config",
+    "help",
+    "download",
+    "outdated",
+    "installed",
+    "daemon",
+    "plan",
+    "which-provider",
+]
+
+
+# Set while a build job runs on a worker thread so its output can be told apart
+_job_context = threading.local()
+_print_lock = threading.Lock()
+
+
+def current_job() -> str | None:
+    return getattr(_job_context, "name", None)
+
+
+def job_prefix() -> str:
+    job = current_job()
+    return f"[{job}] " if job else ""
+
+
+def paint(text: str, color) -> str:
+    colors = get_config().get("colors", {})
+    # git installers may pass an escape code itself, see INSTALLER_BOOTSTRAP
+    code = colors.get(color, "" if color in (GREEN, YELLOW, RED, BLUE, RESET) else color)
+    return f"{code}{text}{colors.get(RESET, '')}"
+
+
+def print_color(text: str, color) -> None:
+    with _print_lock:
+        print(f"{job_prefix()}{paint(text, color)}", flush=True)
+
+
+@contextmanager
+def stdout_to_stderr(enabled=True):
+    """Send what mux and the commands it runs print to stderr, keeping stdout for --json."""
+    if not enabled:
+        yield
+        return
+    sys.stdout.flush()
+    saved = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def help() -> None:
+    help_mesage = """
+    useage: mux <command> [<args>]
+    
+    install          install programs (several names, or - to read them from stdin)
+    remove           uninstall programs
+    update           updates programs
+    search | find    finds programs
+    build            builds a program using a muxFile
+    plan [muxFile]   shows what build would install, skip and download, changing nothing
+    outdated         lists every installed package with a newer version available
+    installed <pkg>  tells whether a package is installed (exit status 1 if not)
+    which-provider <pkg>  lists the package managers that can install a package
+    daemon           runs muxd, which answers search, installed and outdated from memory
+    download [path]  pip installs the imports of a script or project (default: .)
+
+    options:
+    --jobs N         run up to N build jobs at once (default 1, or "jobs" in the config)
+    --serial         run build jobs one at a time: the pacman, flatpak and pip batches,
+                     then the git installers in muxFile order
+    --yes            build without asking for confirmation, let pacman/yay/paru proceed without
+                     asking (--noconfirm), or use the first of several providers
+    --provider NAME  install or remove with this package manager
+    --force          build every muxFile entry again, ignoring muxFile.lock
+    --no-prefetch    install each backend straight away instead of downloading everything first
+    --json           print the plan, the providers or the install/remove/update results as JSON
+    --profile        print where the time went: subprocesses, HTTP and phases
+    --trace-file F   write every span to F as JSON lines
+    --trace-format   "jsonl" (default) or "chrome" for chrome://tracing / Perfetto
+    --refresh        always refresh the package databases first (which-provider: the flatpak catalog)
+    --no-refresh     never refresh the package databases first
+    --batch          run commands headless, output goes to log files (default without a terminal);
+                     install, remove and update then need --yes or --batch
+    --interactive    run commands on the terminal even when stdout is not one
+    --log-dir DIR    where --batch writes its logs (default ~/.cache/mux/logs/<run>)
+    --no-daemon      answer queries in this process even when muxd is running
+    """
+    print_color(help_mesage, YELLOW)
+
+
+def read_key() -> str | Any:
+    import termios
+    import tty
+
+    fd = sys.stdin.fileno()
+    old = termios.tcgetattr(fd)
+    try:
+        tty.setraw(fd)
+        ch1 = sys.stdin.read(1)
+        if ch1 == "\x1b":
+            ch2 = sys.stdin.read(1)
+            ch3 = sys.stdin.read(1)
+            return ch1 + ch2 + ch3
+        elif ch1 == "\x03":
+            raise KeyboardInterrupt()
+        else:
+            return ch1
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old)
+
+
+def draw_menu(items: list, start=0) -> str:
+    longest = max(len(x) for x in items)
+    selected = start
+    print("\n" * len(items), end="")
+
+    while True:
+        print(f"\x1b[{len(items)}F", end="")  # move up to top of menu
+        for i, item in enumerate(items):
+            padded_item = item.center(longest)
+            if i == selected:
+                print(f"\033[7m[*] {padded_item}\033[0m")
+            else:
+                print(f"[ ] {padded_item}")
+
+        key = read_key()
+
+        if key == "\x1b[A":
+            selected = (selected - 1) % len(items)
+        elif key == "\x1b[B":
+            selected = (selected + 1) % len(items)
+        elif key in ("\r", "\n"):
+            # Redraw menu with only the selected item marked with [*], no highlight
+            print(f"\x1b[{len(items)}F", end="")  # move to top
+            for i, item in enumerate(items):
+                padded_item = item.center(longest)
+                prefix = "[*]" if i == selected else "[ ]"
+                print(f"{prefix} {padded_item}")
+            return items[selected]
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# TRACING
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Spans are only recorded while --profile or --trace-file is in use
+_tracing = False
+_spans: list[dict] = []
+
+
+def enable_tracing() -> None:
+    global _tracing
+    _tracing = True
+
+
+def program_name(cmd) -> str:
+    """The program a command really runs, looking through sudo."""
+    args = list(cmd)
+    if args and args[0] == "sudo":
+        args = [a for a in args[1:] if not a.startswith("-")] or ["sudo"]
+    return os.path.basename(args[0]) if args else ""
+
+
+@contextmanager
+def span(category, name, **attrs):
+    """
+    Record how long the body takes as a span of `category` ("subprocess", "http" or "phase").
+    The yielded dict can be filled with more attributes, like an exit code.
+    """
+    if not _tracing:
+        yield attrs
+        return
+
+    wall = time.time()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        _spans.append({
+            "cat": category,
+            "name": name,
+            "ts": wall,
+            "dur": time.perf_counter() - start,
+            "tid": threading.get_ident(),
+            "args": attrs,
+        })
+
+
+def percentile(values, pct) -> float:
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * pct // 100) - 1)
+    return ordered[int(index)]
+
+
+def print_profile() -> None:
+    """Summarise the recorded spans per category and name."""
+    groups: dict[tuple, list] = {}
+    for s in _spans:
+        groups.setdefault((s["cat"], "*"), []).append(s["dur"])
+        groups.setdefault((s["cat"], s["name"]), []).append(s["dur"])
+
+    print_color("\n" + "=" * 60, BLUE)
+    print_color("Profile", BLUE)
+    print(f"{'category':<12}{'name':<24}{'count':>7}{'total ms':>11}{'p95 ms':>10}")
+    # every category starts with its total, followed by its names, slowest first
+    order = sorted(groups.items(), key=lambda g: (g[0][0], g[0][1] != "*", -sum(g[1])))
+    for (category, name), durations in order:
+        label = "(all)" if name == "*" else name[:22]
+        print(
+            f"{category:<12}{label:<24}{len(durations):>7}"
+            f"{sum(durations) * 1000:>11.1f}{percentile(durations, 95) * 1000:>10.1f}"
+        )
+
+
+def write_trace(path, trace_format="jsonl") -> None:
+    """Write the spans as JSON lines, or as a Chrome trace (chrome://tracing, Perfetto)."""
+    with open(path, "w", encoding="utf-8") as f:
+        if trace_format == "chrome":
+            events = [
+                {
+                    "name": s["name"],
+                    "cat": s["cat"],
+                    "ph": "X",
+                    "ts": s["ts"] * 1e6,
+                    "dur": s["dur"] * 1e6,
+                    "pid": os.getpid(),
+                    "tid": s["tid"],
+                    "args": s["args"],
+                }
+                for s in _spans
+            ]
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        else:
+            for s in _spans:
+                line = {k: v for k, v in s.items() if k != "dur"}
+                line["dur_ms"] = round(s["dur"] * 1000, 3)
+                f.write(json.dumps(line, default=str) + "\n")
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# RUNNING COMMANDS
+# ────────────────────────────────────────────────────────────────────────────────
+
+# None until --batch/--interactive decides, otherwise batch mode follows whether stdout is a terminal
+_batch_mode = None
+# --yes: package managers are told not to ask
+_assume_yes = False
+_log_dir = None
+_log_count = 0
+_log_lock = threading.Lock()
+
+# how many lines of a failed command's log to show
+LOG_TAIL_LINES = 20
+
+
+def set_batch_mode(enabled, log_dir=None) -> None:
+    global _batch_mode, _log_dir
+    _batch_mode = enabled
+    if log_dir:
+        _log_dir = os.path.expanduser(log_dir)
+
+
+def batch_mode() -> bool:
+    """Whether commands run headless, with their output going to log files."""
+    if _batch_mode is None:
+        return not sys.stdout.isatty()
+    return _batch_mode
+
+
+def set_assume_yes(enabled) -> None:
+    global _assume_yes
+    _assume_yes = enabled
+
+
+def unattended() -> bool:
+    """
+    Whether package managers may skip their questions: only when asked to with --yes or
+    --batch, never just because stdout isn't a terminal.
+    """
+    return bool(_assume_yes or _batch_mode)
+
+
+def exit_code(status) -> int:
+    """Shell style exit code: a command killed by a signal exits with 128 + the signal."""
+    return 128 - status if status < 0 else status
+
+
+def next_log_path(cmd) -> str:
+    """A new log file for cmd inside this run's log directory."""
+    global _log_dir, _log_count
+    with _log_lock:
+        if _log_dir is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            _log_dir = os.path.join(get_cache_dir(), "logs", f"{stamp}-{os.getpid()}")
+        os.makedirs(_log_dir, exist_ok=True)
+        _log_count += 1
+        label = re.sub(r"[^\w.-]+", "_", current_job() or program_name(cmd))
+        return os.path.join(_log_dir, f"{_log_count:03d}-{label}.log")
+
+
+def log_tail(path, lines=LOG_TAIL_LINES) -> list:
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 64 * 1024))
+            return f.read().decode(errors="replace").splitlines()[-lines:]
+    except OSError:
+        return []
+
+
+def run_cmd(cmd, sudo=False) -> int:
+    """Run a command and return its exit code."""
+    if sudo:
+        cmd = ["sudo"] + cmd
+
+    batch = batch_mode()
+    if not batch:
+        with _print_lock:
+            print(f"{job_prefix()}🔧 Running: {' '.join(cmd)}", flush=True)
+
+    with span("subprocess", program_name(cmd), argv=cmd) as info:
+        try:
+            if batch:
+                exitcode = run_cmd_logged(cmd)
+            elif current_job():
+                # several jobs may be running, so never hand one of them the terminal
+                exitcode = run_cmd_piped(cmd)
+            else:
+                import pty
+
+                # pty.spawn takes care of all the terminal stuff for us
+                exitcode = exit_code(os.waitstatus_to_exitcode(pty.spawn(cmd)))
+            info["exit_code"] = exitcode
+            return exitcode
+        except Exception as e:
+            info["error"] = str(e)
+            print_color(f"❌ Command failed: {' '.join(cmd)}", RED)
+            print_color(str(e), RED)
+            return 127 if isinstance(e, FileNotFoundError) else 1
+
+
+def run_cmd_piped(cmd) -> int:
+    """Run a command with its output read line by line and prefixed with the current job."""
+    import subprocess
+
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    for line in proc.stdout:
+        with _print_lock:
+            print(f"{job_prefix()}{line.rstrip()}", flush=True)
+    return exit_code(proc.wait())
+
+
+def run_cmd_logged(cmd) -> int:
+    """
+    Run a command without a terminal, its output going straight into a log file,
+    and print a single summary line. A failed command also shows the end of its log.
+    """
+    import subprocess
+
+    path = next_log_path(cmd)
+    start = time.perf_counter()
+    with open(path, "wb") as log:
+        log.write(f"$ {' '.join(cmd)}\n".encode())
+        log.flush()
+        # the child writes to the file itself, nothing is copied through python
+        status = exit_code(
+            subprocess.call(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+        )
+    elapsed = time.perf_counter() - start
+
+    label = current_job() or program_name(cmd)
+    command = " ".join(cmd)
+    mark, color = ("✔", GREEN) if status == 0 else ("✘", RED)
+    with _print_lock:
+        print(
+            f"[{label}] {paint(f'{mark} {command}', color)} "
+            f"(exit {status}, {elapsed:.1f}s, log: {path})",
+            flush=True,
+        )
+        if status != 0:
+            for line in log_tail(path):
+                print(f"[{label}] | {line}", flush=True)
+    return status
+
+
+# program -> its path, or None when it is not installed
+_which: dict[str, str | None] = {}
+
+
+def which(program) -> str | None:
+    """shutil.which, probed once per program."""
+    if program not in _which:
+        import shutil
+
+        _which[program] = shutil.which(program)
+    return _which[program]
+
+
+def run_capture(cmd) -> "subprocess.CompletedProcess":
+    """Run a command without a terminal and return its captured output."""
+    import subprocess
+
+    with span("subprocess", program_name(cmd), argv=list(cmd)) as info:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        info["exit_code"] = result.returncode
+    return result
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# INSTALLED PACKAGE SNAPSHOT
+# ────────────────────────────────────────────────────────────────────────────────
+
+PACMAN_LIKE = ("pacman", "yay", "paru")
+
+# backend name -> set of installed names, valid for the lifetime of this process
+_snapshots: dict[str, set] = {}
+
+# bumped whenever what a backend's snapshot holds changes shape
+SNAPSHOT_VERSION = 4
+
+
+def get_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    cache_dir = os.path.join(cache_home, "mux")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def load_cache(name) -> dict:
+    path = os.path.join(get_cache_dir(), name)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(name, data) -> None:
+    path = os.path.join(get_cache_dir(), name)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # The cache is only an optimisation, never fail a command because of it
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def path_signature(paths) -> list:
+    """Cheap change detector: the mtime and size of every given path."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([path, st.st_mtime_ns, st.st_size])
+        except OSError:
+            signature.append([path, None, None])
+    return signature
+
+
+def normalize_dist_name(name) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def pacman_state_paths() -> list:
+    # pacman adds or removes an entry here on every transaction
+    return [os.path.join(setting("pacman_db_path"), "local")]
+
+
+def list_pacman_installed() -> set | None:
+    if not which("pacman"):
+        return None
+    result = run_capture(["pacman", "-Q"])
+    if result.returncode != 0:
+        return None
+    return {line.split()[0] for line in result.stdout.splitlines() if line.strip()}
+
+
+def flatpak_state_paths() -> list:
+    return [
+        "/var/lib/flatpak/app",
+        "/var/lib/flatpak/.changed",
+        os.path.expanduser("~/.local/share/flatpak/app"),
+        os.path.expanduser("~/.local/share/flatpak/.changed"),
+    ]
+
+
+def list_flatpak_installed() -> dict | None:
+    """{app ID: {"branch", "origin", "name"}} of every installed flatpak app, from one listing."""
+    if not which("flatpak"):
+        return None
+    result = run_capture(
+        ["flatpak", "list", "--app", "--columns=application,branch,origin,name"]
+    )
+    if result.returncode != 0:
+        return None
+    installed = {}
+    for line in result.stdout.splitlines():
+        fields = line.strip().split("\t")
+        if not fields[0]:
+            continue
+        fields += [""] * (4 - len(fields))
+        installed[fields[0]] = {"branch": fields[1], "origin": fields[2], "name": fields[3]}
+    return installed
+
+
+def apt_state_paths() -> list:
+    # dpkg rewrites its status file on every transaction
+    return ["/var/lib/dpkg/status"]
+
+
+def list_apt_installed() -> set | None:
+    if not which("dpkg-query"):
+        return None
+    result = run_capture(["dpkg-query", "-W", "-f", "${Package}\t${db:Status-Abbrev}\n"])
+    if result.returncode != 0:
+        return None
+    installed = set()
+    for line in result.stdout.splitlines():
+        name, _, status = line.partition("\t")
+        # "ii" is installed, anything else is removed, half-configured, ...
+        if status.startswith("ii"):
+            installed.add(name.split(":")[0])
+    return installed
+
+
+def dnf_state_paths() -> list:
+    return ["/var/lib/rpm", "/usr/lib/sysimage/rpm"]
+
+
+def list_dnf_installed() -> set | None:
+    if not which("rpm"):
+        return None
+    result = run_capture(["rpm", "-qa", "--qf", "%{NAME}\n"])
+    if result.returncode != 0:
+        return None
+    return {line.strip() for line in result.stdout.splitlines() if line.strip()}
+
+
+_pip_paths: list | None = None
+
+
+def pip_targets_self() -> bool:
+    """Whether mux installs pip packages for the interpreter it runs on."""
+    python = setting("python")
+    return not python or os.path.abspath(which(python) or python) == os.path.abspath(sys.executable)
+
+
+def pip_paths() -> list:
+    """sys.path of the interpreter mux installs pip packages for (the "python" setting)."""
+    global _pip_paths
+    if _pip_paths is not None:
+        return _pip_paths
+
+    if pip_targets_self():
+        _pip_paths = list(sys.path)
+        return _pip_paths
+
+    # ask the other interpreter once, and again only when it is replaced
+    python = which(setting("python")) or setting("python")
+    try:
+        st = os.stat(python)
+        key = [python, st.st_mtime_ns, st.st_size]
+    except OSError:
+        key = [python, None, None]
+    cache = load_cache("interpreters.json")
+    if cache.get(python, {}).get("key") == key:
+        _pip_paths = cache[python]["path"]
+        return _pip_paths
+
+    result = run_capture([python, "-c", "import json, sys; print(json.dumps(sys.path))"])
+    try:
+        _pip_paths = json.loads(result.stdout) if result.returncode == 0 else []
+    except ValueError:
+        _pip_paths = []
+    if _pip_paths:
+        cache[python] = {"key": key, "path": _pip_paths}
+        save_cache("interpreters.json", cache)
+    return _pip_paths
+
+
+def pip_state_paths() -> list:
+    return [p for p in pip_paths() if p and os.path.isdir(p)]
+
+
+def metadata_version(path) -> str | None:
+    """The Version: header of a *.dist-info or *.egg-info entry."""
+    if os.path.isdir(path):
+        for name in ("METADATA", "PKG-INFO"):
+            if os.path.exists(os.path.join(path, name)):
+                path = os.path.join(path, name)
+                break
+        else:
+            return None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith("Version:"):
+                    return line.split(":", 1)[1].strip()
+                if not line.strip():
+                    # the headers are over
+                    break
+    except OSError:
+        pass
+    return None
+
+
+def list_pip_installed() -> dict | None:
+    """
+    {normalized name: version} of every distribution on the target interpreter's path.
+    The name and version come from the *.dist-info / *.egg-info directory names, so
+    no metadata file is opened unless the name has no version in it.
+    """
+    installed = {}
+    for path in pip_state_paths():
+        try:
+            entries = os.listdir(path)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.endswith(".dist-info"):
+                name, _, version = entry[:-10].rpartition("-")
+            elif entry.endswith(".egg-info"):
+                name, _, version = entry[:-9].partition("-")
+                version = version.split("-")[0]
+            else:
+                continue
+            if not name:
+                name, version = version, ""
+            name = normalize_dist_name(name)
+            # like the import system, the first entry on the path wins
+            if name not in installed:
+                installed[name] = version or metadata_version(os.path.join(path, entry))
+    return installed
+
+
+SNAPSHOT_SOURCES = {
+    "pacman": (pacman_state_paths, list_pacman_installed),
+    "flatpak": (flatpak_state_paths, list_flatpak_installed),
+    "pip": (pip_state_paths, list_pip_installed),
+    "apt": (apt_state_paths, list_apt_installed),
+    "dnf": (dnf_state_paths, list_dnf_installed),
+}
+
+
+def installed_set(backend) -> set | dict | None:
+    """
+    Return the set of packages installed by a backend, or None if the backend is unavailable.
+    pip's is a dict of name -> version, flatpak's a dict of app ID -> branch and origin.
+    The set is enumerated once and kept on disk until the backend's state paths change.
+    """
+    if backend in _snapshots:
+        return _snapshots[backend]
+
+    with span("phase", f"snapshot:{backend}"):
+        state_paths, list_installed = SNAPSHOT_SOURCES[backend]
+        signature = path_signature(state_paths())
+        cache = load_cache("installed.json")
+        entry = cache.get(backend)
+
+        if entry and entry.get("version") == SNAPSHOT_VERSION and entry.get("signature") == signature:
+            items = entry["items"]
+            if isinstance(items, list):
+                items = set(items)
+        else:
+            items = list_installed()
+            if items is None:
+                return None
+            cache[backend] = {
+                "version": SNAPSHOT_VERSION,
+                "signature": signature,
+                "items": items if isinstance(items, dict) else sorted(items),
+            }
+            save_cache("installed.json", cache)
+
+        _snapshots[backend] = items
+        return items
+
+
+def invalidate_snapshot(backend=None) -> None:
+    """Forget the in-memory snapshot after mux changed what is installed."""
+    if backend is None:
+        _snapshots.clear()
+    else:
+        _snapshots.pop(backend, None)
+    if backend in (None, "pacman"):
+        invalidate_versions()
+
+
+def is_up_to_date(pkg) -> bool:
+    """Check if the package is up-to-date (pacman only)."""
+    installed_version = local_versions().get(pkg)
+    if not installed_version:
+        print_color(f"❌ {pkg} is not installed.", RED)
+        return False
+
+    available = sync_versions().get(pkg)
+    if not available:
+        print_color(f"❌ Could not check updates for {pkg}.", RED)
+        return False
+
+    available_version = available[1]
+    if vercmp(installed_version, available_version) >= 0:
+        print_color(
+            f"{pkg} is up-to-date (installed: {installed_version}, available: {available_version}).",
+            GREEN,
+        )
+        return True
+    else:
+        print_color(
+            f"{pkg} is not up-to-date (installed: {installed_version}, available: {available_version}).",
+            YELLOW,
+        )
+        return False
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BACKENDS
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def pacman_command(manager, action) -> list | None:
+    program = manager["name"]
+    flags = {
+        "install": [manager.get("install_flag") or "-S"],
+        "remove": [manager.get("remove_flag") or "-R"],
+        "update": [manager.get("install_flag") or "-S"],
+        "upgrade": ["-Syu"],
+        "download": ["-Sw", "--needed"],
+    }[action]
+    # nobody is there to answer pacman's questions, or yay's about reviewing PKGBUILDs
+    if unattended() or action == "download":
+        flags.append("--noconfirm")
+    return [program, *flags]
+
+
+def flatpak_command(manager, action) -> list | None:
+    install_flag = manager.get("install_flag") or "install"
+    return {
+        "install": ["flatpak", install_flag, "-y", flatpak_remote(manager)],
+        "remove": ["flatpak", manager.get("remove_flag") or "uninstall", "-y"],
+        "update": ["flatpak", "update", "-y"],
+        "upgrade": ["flatpak", "update", "-y"],
+        "download": ["flatpak", install_flag, "--no-deploy", "-y", flatpak_remote(manager)],
+    }[action]
+
+
+def pip_backend_command(manager, action) -> list | None:
+    return {
+        "install": [*pip_command(), "install"],
+        "remove": [*pip_command(), "uninstall", "-y"],
+        "update": [*pip_command(), "install", "--upgrade"],
+        "upgrade": None,
+        # wheels rather than `pip download`, an sdist would still need its build
+        # dependencies from the index when installed with --no-index
+        "download": [*pip_command(), "wheel", "--wheel-dir", wheelhouse_dir()],
+    }[action]
+
+
+def apt_command(manager, action) -> list | None:
+    return {
+        "install": ["apt-get", "install", "-y"],
+        "remove": ["apt-get", "remove", "-y"],
+        "update": ["apt-get", "install", "--only-upgrade", "-y"],
+        "upgrade": ["apt-get", "upgrade", "-y"],
+        "download": ["apt-get", "install", "--download-only", "-y"],
+    }[action]
+
+
+def dnf_command(manager, action) -> list | None:
+    return {
+        "install": ["dnf", "install", "-y"],
+        "remove": ["dnf", "remove", "-y"],
+        "update": ["dnf", "upgrade", "-y"],
+        "upgrade": ["dnf", "upgrade", "-y"],
+        "download": ["dnf", "install", "--downloadonly", "-y"],
+    }[action]
+
+
+def custom_command(manager, action) -> list | None:
+    if action == "download":
+        return None
+    # the "custom installer mode": the flags come from the config
+    flag = {
+        "install": manager.get("install_flag") or "-S",
+        "remove": manager.get("remove_flag", ""),
+        "update": manager.get("install_flag") or "-S",
+        "upgrade": "-Syu",
+    }[action]
+    return [manager["name"], flag]
+
+
+def same_name(pkg, name, installed) -> bool:
+    return pkg.lower() == name.lower()
+
+
+def snapshot_installed(manager, name) -> bool | None:
+    installed = list_installed(manager)
+    return None if installed is None else name in installed
+
+
+def custom_installed(manager, name) -> bool | None:
+    # a custom manager can only tell with a query flag, one name at a time
+    if not manager.get("query_flag"):
+        return None
+    return run_capture([manager["name"], manager["query_flag"], name]).returncode == 0
+
+
+def pip_version(name) -> str | None:
+    installed = installed_set("pip") or {}
+    return installed.get(normalize_dist_name(split_requirement(name)[0]))
+
+
+def pacman_up_to_date(manager, name) -> bool | None:
+    if name not in local_versions():
+        return None
+    return name not in {o[0] for o in outdated_packages()}
+
+
+# What mux needs from each kind of package manager. A manager in PACKAGE_MANAGERS
+# uses the backend of its name, or the one named by its "backend" key, else "custom".
+#   programs     executables it needs, probed once per process. None: the manager's name
+#   snapshot     the installed-package snapshot it reads (SNAPSHOT_SOURCES). Managers
+#                sharing one also share their packages, like pacman, yay and paru.
+#   command      (manager, action) -> the command that installs, removes, updates or
+#                only downloads the names appended to it, or upgrades everything;
+#                None if it can't
+#   search       (manager, term) -> the command that searches it, or None
+#   search_cached (manager, term, label) -> print results tagged [label] without a
+#                subprocess, False if it can't
+#   search_unlisted (manager, term) -> the command that only searches what its providers
+#                can't see, for when a manager sharing its snapshot is searched as well
+#   providers    (manager, pkg, refresh) -> what it would install for pkg, see package_providers
+#   up_to_date   (manager, name) -> whether an installed package is the newest, None if unknown
+#   installed    (manager, name) -> whether name is installed, None if it can't tell.
+#                Membership in the snapshot by default
+#   version      (name) -> the installed version of name, for muxFile.lock
+#   default_sudo whether it runs as root when the manager doesn't set "sudo"
+#   refresh      (manager) -> fetch what its providers look at again
+#   unlisted     it may install packages its providers can't see
+#   matches      (pkg, name, installed) -> whether pkg names the installed package name,
+#                the same name ignoring case by default
+BACKENDS = {
+    "pacman": {
+        "programs": None,
+        "snapshot": "pacman",
+        "command": pacman_command,
+        "search": lambda manager, term: [manager["name"], manager.get("search_flag", "-Ss"), term],
+        "search_cached": lambda manager, term, label: (
+            bool(setting("search_index")) and search_index(term, label)
+        ),
+        "providers": lambda manager, pkg, refresh: sync_providers(pkg),
+        "up_to_date": pacman_up_to_date,
+        "version": lambda name: local_versions().get(name),
+        "default_sudo": True,
+    },
+    "flatpak": {
+        "programs": ["flatpak"],
+        "snapshot": "flatpak",
+        "command": flatpak_command,
+        "search": lambda manager, term: ["flatpak", "search", term],
+        "search_cached": lambda manager, term, label: search_flatpak(
+            term, flatpak_remote(manager), label
+        ),
+        "providers": lambda manager, pkg, refresh: flatpak_providers(
+            pkg, flatpak_remote(manager), refresh=refresh
+        ),
+        "matches": lambda pkg, app, installed: flatpak_matches(
+            pkg, app, installed[app].get("name", "")
+        ),
+        "installed": lambda manager, app: flatpak_installed(app),
+        "version": lambda app: (installed_set("flatpak") or {}).get(app, {}).get("branch"),
+        "refresh": lambda manager: flatpak_catalog(flatpak_remote(manager), refresh=True),
+    },
+    "pip": {
+        "programs": [],
+        "snapshot": "pip",
+        "command": pip_backend_command,
+        # PyPI turned off `pip search`, the index is only asked for exact names
+        "search": lambda manager, term: None,
+        "providers": lambda manager, pkg, refresh: pip_providers(pkg),
+        "matches": lambda pkg, name, installed: normalize_dist_name(pkg) == name,
+        # requirements like "requests>=2.31" are checked against the installed version
+        "installed": lambda manager, name: pip_installed(name),
+        "version": pip_version,
+    },
+    "apt": {
+        "programs": ["apt-get", "dpkg-query"],
+        "snapshot": "apt",
+        "command": apt_command,
+        "search": lambda manager, term: ["apt-cache", "search", term],
+        "default_sudo": True,
+    },
+    "dnf": {
+        "programs": ["dnf", "rpm"],
+        "snapshot": "dnf",
+        "command": dnf_command,
+        "search": lambda manager, term: ["dnf", "search", term],
+        "default_sudo": True,
+    },
+    "custom": {
+        "programs": None,
+        "snapshot": None,
+        "command": custom_command,
+        "search": lambda manager, term: [manager["name"], manager.get("search_flag", "-Ss"), term],
+        "installed": custom_installed,
+    },
+}
+# the AUR helpers install everything pacman does, and whatever the AUR has on top.
+# They ask for root themselves.
+BACKENDS["yay"] = BACKENDS["paru"] = dict(
+    BACKENDS["pacman"],
+    unlisted=True,
+    search_cached=None,
+    search_unlisted=lambda manager, term: [
+        manager["name"], manager.get("search_flag", "-Ss"), "--aur", term
+    ],
+    default_sudo=False,
+)
+
+
+def get_backend(manager) -> dict:
+    return BACKENDS.get(manager.get("backend") or manager["name"], BACKENDS["custom"])
+
+
+def manager_sudo(manager) -> bool:
+    return manager.get("sudo", get_backend(manager).get("default_sudo", False))
+
+
+def backend_available(manager) -> bool:
+    programs = get_backend(manager)["programs"]
+    if programs is None:
+        programs = [manager["name"]]
+    return all(which(program) for program in programs)
+
+
+_managers: list | None = None
+
+
+def available_managers() -> list:
+    """The configured package managers whose programs are installed, probed once."""
+    global _managers
+    if _managers is None:
+        _managers = []
+        for manager in package_managers():
+            if manager.get("name") and manager not in _managers and backend_available(manager):
+                _managers.append(manager)
+    return _managers
+
+
+def list_installed(manager) -> set | dict | None:
+    """Everything the manager has installed, None when it has no way to tell."""
+    snapshot = get_backend(manager)["snapshot"]
+    return installed_set(snapshot) if snapshot else None
+
+
+def query_many(manager, names) -> dict:
+    """{name: installed?} for every name, answered from one snapshot. None when it can't tell."""
+    installed = get_backend(manager).get("installed", snapshot_installed)
+    return {name: installed(manager, name) for name in names}
+
+
+def run_many(manager, action, names, options=()) -> tuple[list, int]:
+    """
+    install/remove/update names with a single command, retrying one at a time only what
+    the batch missed. options are extra arguments for the command.
+    Returns the names that failed and the last failed exit code.
+    """
+    backend = get_backend(manager)
+    cmd = backend["command"](manager, action)
+    if cmd is None:
+        print_color(f"❌ {manager['name']} can't {action} packages.", RED)
+        return list(names), 1
+    cmd += [option for option in options if option not in cmd]
+
+    def done(name) -> bool:
+        installed = query_many(manager, [name])[name]
+        if action == "remove":
+            return installed is False
+        if action == "update" and "up_to_date" in backend:
+            return bool(backend["up_to_date"](manager, name))
+        return bool(installed)
+
+    return install_batch(
+        manager["name"], cmd, list(names), done,
+        sudo=manager_sudo(manager), snapshot=backend["snapshot"],
+    )
+
+
+def install_many(manager, names, options=()) -> tuple[list, int]:
+    return run_many(manager, "install", names, options)
+
+
+def muxfile_manager(package_type, plan=None) -> dict:
+    """The manager muxFile entries of a type are installed with, from the plan's remote if any."""
+    manager = {"name": package_type}
+    part = plan["backends"].get(package_type, {}) if plan is not None else {}
+    if "remote" in part:
+        manager["remote"] = part["remote"]
+    return manager
+
+
+def is_installed(pkg) -> bool:
+    """Whether any manager has pkg installed, flatpak apps also by their name (see flatpak_matches)."""
+    with span("phase", "is_installed", pkg=pkg):
+        managers = available_managers()
+        return any(query_many(manager, [pkg])[pkg] for manager in managers) or any(
+            installed_providers(pkg, managers).values()
+        )
+
+
+def installed_with(pkg, managers) -> dict | None:
+    """
+    The first of managers that has pkg installed under exactly that name, or None.
+    What an install checks before it runs: only the managers it may use are asked.
+    """
+    return next((manager for manager in managers if query_many(manager, [pkg])[pkg]), None)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# SEARCH INDEX
+# ────────────────────────────────────────────────────────────────────────────────
+
+# bump when the layout of the index changes, the index is then rebuilt from scratch
+INDEX_VERSION = 2
+
+
+def parse_desc(text) -> dict:
+    """Parse a pacman database desc file into {"NAME": [...], "VERSION": [...], ...}."""
+    fields = {}
+    key = None
+    for line in text.splitlines():
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            key = line[1:-1]
+            fields[key] = []
+        elif line and key:
+            fields[key].append(line)
+    return fields
+
+
+def read_sync_db(path) -> list:
+    """Return the desc fields of every package in a pacman sync database."""
+    import tarfile
+
+    packages = []
+    with tarfile.open(path, "r:*") as db:
+        for member in db:
+            if not member.isfile() or not member.name.endswith("/desc"):
+                continue
+            fields = parse_desc(db.extractfile(member).read().decode(errors="replace"))
+            if fields.get("NAME"):
+                packages.append(fields)
+    return packages
+
+
+def fts_available() -> bool:
+    import sqlite3
+
+    try:
+        sqlite3.connect(":memory:").execute(
+            "CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')"
+        )
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def open_index() -> "sqlite3.Connection":
+    import sqlite3
+
+    conn = sqlite3.connect(os.path.join(get_cache_dir(), "index.sqlite"))
+    if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+        conn.executescript("""
+            DROP TABLE IF EXISTS sources;
+            DROP TABLE IF EXISTS packages;
+            DROP TABLE IF EXISTS packages_fts;
+        """)
+        conn.executescript("""
+            CREATE TABLE sources (repo TEXT PRIMARY KEY, path TEXT, mtime INTEGER, size INTEGER);
+            CREATE TABLE packages (
+                repo TEXT, name TEXT, version TEXT, desc TEXT, csize INTEGER, provides TEXT,
+                groups TEXT
+            );
+            CREATE INDEX packages_name ON packages (name);
+            CREATE INDEX packages_repo ON packages (repo);
+        """)
+        if fts_available():
+            conn.execute(
+                "CREATE VIRTUAL TABLE packages_fts USING fts5(name, desc, tokenize='trigram')"
+            )
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.commit()
+    return conn
+
+
+def has_fts(conn) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'packages_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def index_repo(conn, repo, packages) -> None:
+    fts = has_fts(conn)
+    if fts:
+        conn.execute(
+            "DELETE FROM packages_fts WHERE rowid IN (SELECT rowid FROM packages WHERE repo = ?)",
+            (repo,),
+        )
+    conn.execute("DELETE FROM packages WHERE repo = ?", (repo,))
+
+    for fields in packages:
+        name = fields["NAME"][0]
+        desc = " ".join(fields.get("DESC", []))
+        csize = fields.get("CSIZE", ["0"])[0]
+        cursor = conn.execute(
+            "INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                repo,
+                name,
+                fields.get("VERSION", [""])[0],
+                desc,
+                int(csize) if csize.isdigit() else 0,
+                " ".join(fields.get("PROVIDES", [])),
+                " ".join(fields.get("GROUPS", [])),
+            ),
+        )
+        if fts:
+            conn.execute(
+                "INSERT INTO packages_fts (rowid, name, desc) VALUES (?, ?, ?)",
+                (cursor.lastrowid, name, desc),
+            )
+
+
+def refresh_index(conn) -> int:
+    """
+    Bring the index in line with the pacman sync databases, re-reading only the
+    databases whose mtime or size changed. Returns the number of indexed repos.
+    """
+    import glob
+    import tarfile
+
+    with span("phase", "index_refresh"):
+        known = {
+            repo: (path, mtime, size)
+            for repo, path, mtime, size in conn.execute("SELECT * FROM sources")
+        }
+        current = set()
+
+        for path in sorted(glob.glob(os.path.join(setting("pacman_db_path"), "sync", "*.db"))):
+            repo = os.path.basename(path)[:-3]
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            current.add(repo)
+            if known.get(repo) == (path, st.st_mtime_ns, st.st_size):
+                continue
+
+            try:
+                packages = read_sync_db(path)
+            except (OSError, tarfile.TarError) as e:
+                print_color(f"[WARN] Could not read {path}: {e}", YELLOW)
+                current.discard(repo)
+                continue
+
+            index_repo(conn, repo, packages)
+            conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                (repo, path, st.st_mtime_ns, st.st_size),
+            )
+
+        for repo in set(known) - current:
+            index_repo(conn, repo, [])
+            conn.execute("DELETE FROM sources WHERE repo = ?", (repo,))
+
+        conn.commit()
+        return len(current)
+
+
+def query_index(conn, term) -> list:
+    """
+    Find packages whose name or description contains every word of `term`.
+    Exact name matches come first, then name prefixes, other name matches and
+    finally description-only matches.
+    """
+    words = term.lower().split()
+    if not words:
+        return []
+
+    if has_fts(conn) and all(len(w) >= 3 for w in words):
+        # trigram tokens match substrings, quote each word so it is taken literally
+        match = " AND ".join('"' + w.replace('"', '""') + '"' for w in words)
+        candidates = conn.execute(
+            "SELECT p.repo, p.name, p.version, p.desc FROM packages_fts f "
+            "JOIN packages p ON p.rowid = f.rowid WHERE packages_fts MATCH ?",
+            (match,),
+        ).fetchall()
+    else:
+        where = " AND ".join("(lower(name) LIKE ? OR lower(desc) LIKE ?)" for _ in words)
+        params = [f"%{w}%" for w in words for _ in range(2)]
+        candidates = conn.execute(
+            f"SELECT repo, name, version, desc FROM packages WHERE {where}", params
+        ).fetchall()
+
+    needle = words[0]
+
+    def rank(row) -> tuple:
+        name = row[1].lower()
+        if name == needle:
+            score = 0
+        elif name.startswith(needle):
+            score = 1
+        elif all(w in name for w in words):
+            score = 2
+        else:
+            score = 3
+        return (score, len(name), name, row[0])
+
+    return sorted(candidates, key=rank)
+
+
+_index: "sqlite3.Connection | None" = None
+
+
+def get_index() -> "sqlite3.Connection":
+    """The index connection, opened once and kept for the rest of the process."""
+    global _index
+    if _index is None:
+        _index = open_index()
+    return _index
+
+
+def search_index(pkg, label="pacman") -> bool:
+    """Print pacman results from the local index. Returns False if there is no index to use."""
+    conn = get_index()
+    if refresh_index(conn) == 0:
+        return False
+    rows = query_index(conn, pkg)
+
+    tag = paint(f"[{label}]", BLUE)
+    installed = installed_set("pacman") or set()
+    for repo, name, version, desc in rows:
+        marker = " [installed]" if name in installed else ""
+        print(f"{tag} \033[1;34m{repo}/{name} {version}{marker}\033[0m")
+        print(f"{tag}     {desc}")
+    return True
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# FLATPAK CATALOG
+# ────────────────────────────────────────────────────────────────────────────────
+
+# remote -> {"time", "signature", "apps"}, what `flatpak remote-ls` last returned
+_flatpak_catalogs: dict[str, dict] = {}
+
+
+def flatpak_remote_paths() -> list:
+    # flatpak rewrites its cached copy of a remote's summary whenever it fetches a new one
+    return [
+        "/var/lib/flatpak/repo/config",
+        "/var/lib/flatpak/repo/tmp/cache/summaries",
+        os.path.expanduser("~/.local/share/flatpak/repo/config"),
+        os.path.expanduser("~/.local/share/flatpak/repo/tmp/cache/summaries"),
+    ]
+
+
+def flatpak_catalog(remote, refresh=False) -> dict | None:
+    """
+    {app ID: {"name": ..., "branch": ...}} of every app a remote offers, or None when it
+    can't be listed. The listing is kept on disk until it is older than sync_ttl seconds
+    or flatpak fetched a new summary of the remote.
+    """
+    signature = path_signature(flatpak_remote_paths())
+    cached = _flatpak_catalogs.get(remote)
+    if cached is None:
+        cached = load_cache("flatpak-catalog.json").get(remote)
+    if (
+        cached
+        and not refresh
+        and cached.get("signature") == signature
+        and time.time() - cached.get("time", 0) < setting("sync_ttl")
+    ):
+        _flatpak_catalogs[remote] = cached
+        return cached["apps"]
+
+    if not which("flatpak"):
+        return None
+    with span("phase", f"flatpak_catalog:{remote}"):
+        result = run_capture(
+            ["flatpak", "remote-ls", remote, "--app", "--columns=application,name,branch"]
+        )
+    if result.returncode != 0:
+        return None
+
+    apps = {}
+    for line in result.stdout.splitlines():
+        fields = line.strip().split("\t")
+        if not fields[0]:
+            continue
+        fields += [""] * (3 - len(fields))
+        apps[fields[0]] = {"name": fields[1], "branch": fields[2]}
+
+    cached = {"time": time.time(), "signature": signature, "apps": apps}
+    _flatpak_catalogs[remote] = cached
+    catalogs = load_cache("flatpak-catalog.json")
+    catalogs[remote] = cached
+    save_cache("flatpak-catalog.json", catalogs)
+    return apps
+
+
+def flatpak_available(app, remote) -> bool | None:
+    """Whether the remote offers the app, None when its catalog can't be listed."""
+    apps = flatpak_catalog(remote)
+    if apps is None:
+        return None
+    return app in apps or any(app.lower() == other.lower() for other in apps)
+
+
+def search_flatpak(pkg, remote, label="flatpak") -> bool:
+    """Print flatpak results from the remote's catalog. Returns False if there is no catalog to use."""
+    apps = flatpak_catalog(remote)
+    if apps is None:
+        return False
+
+    term = pkg.lower()
+    tag = paint(f"[{label}]", BLUE)
+    installed = installed_set("flatpak") or {}
+    for app, info in sorted(apps.items()):
+        if term in app.lower() or term in info["name"].lower():
+            marker = " [installed]" if app in installed else ""
+            print(f"{tag} \033[1;34m{remote}/{app} {info['branch']}{marker}\033[0m")
+            print(f"{tag}     {info['name']}")
+    return True
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PROVIDER INDEX
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def sync_providers(pkg) -> list | None:
+    """
+    Packages in the pacman sync databases named pkg or providing it, the repo pacman
+    would pick first. Failing that, the members of the group pkg (base-devel, gnome, ...),
+    which have "group" set. None when there are no sync databases to look in.
+    """
+    conn = get_index()
+    if refresh_index(conn) == 0:
+        return None
+
+    pattern = re.sub(r"([\\%_])", r"\\\1", pkg)
+    rows = conn.execute(
+        "SELECT repo, name, version, provides FROM packages WHERE name = ? "
+        "OR ' ' || provides || ' ' LIKE ? ESCAPE '\\' OR ' ' || provides || ' ' LIKE ? ESCAPE '\\'",
+        (pkg, f"% {pattern} %", f"% {pattern}=%"),
+    ).fetchall()
+
+    order = {repo: i for i, repo in enumerate(sync_repo_order())}
+    found = []
+    for repo, name, version, provides in rows:
+        # LIKE ignores case, provides don't
+        if name != pkg and pkg not in (p.partition("=")[0] for p in provides.split()):
+            continue
+        found.append({
+            "name": name,
+            "version": version,
+            "source": repo,
+            "provides": None if name == pkg else pkg,
+        })
+    if not found:
+        # pacman -S takes a group name too, and installs its members
+        found = [
+            {"name": name, "version": version, "source": repo, "provides": None, "group": pkg}
+            for repo, name, version, groups in conn.execute(
+                "SELECT repo, name, version, groups FROM packages "
+                "WHERE ' ' || groups || ' ' LIKE ? ESCAPE '\\'",
+                (f"% {pattern} %",),
+            )
+            # LIKE ignores case, groups don't
+            if pkg in groups.split()
+        ]
+    found.sort(
+        key=lambda c: (c["provides"] is not None, order.get(c["source"], len(order)), c["name"])
+    )
+    return found
+
+
+def flatpak_matches(pkg, app, name="") -> bool:
+    """Whether pkg names a flatpak app: its ID, the last part of its ID or its name, ignoring case."""
+    return pkg.lower() in (app.lower(), app.rsplit(".", 1)[-1].lower(), name.lower())
+
+
+def flatpak_providers(pkg, remote, refresh=False) -> list | None:
+    """Apps on the remote that pkg names, see flatpak_matches."""
+    apps = flatpak_catalog(remote, refresh=refresh)
+    if apps is None:
+        return None
+    return [
+        {"name": app, "version": info["branch"], "source": remote, "provides": None}
+        for app, info in sorted(apps.items())
+        if flatpak_matches(pkg, app, info["name"])
+    ]
+
+
+def pip_providers(pkg) -> list | None:
+    """The distribution on the configured pip index (the "pip_index" setting), if there is one."""
+    name = normalize_dist_name(pkg)
+    url = f"{setting('pip_index').rstrip('/')}/{name}/"
+    status, body = http_get(
+        url, cache_key=url, headers={"Accept": "application/vnd.pypi.simple.v1+json"}
+    )
+    if status == 404:
+        return []
+    if status != 200:
+        return None
+    try:
+        versions = json.loads(body).get("versions") or [""]
+    except ValueError:
+        # an index without the JSON API still answers with its HTML page
+        versions = [""]
+    return [
+        {"name": name, "version": versions[-1], "source": setting("pip_index"), "provides": None}
+    ]
+
+
+def package_providers(pkg, managers, refresh=False) -> dict:
+    """
+    {manager name: candidates} for the given managers, in their order. The candidates are
+    what the manager would install for pkg, an empty list when it can't provide pkg and
+    None when it has no way to tell (the AUR, managers mux knows nothing about).
+    Managers that share their packages, like pacman, yay and paru, are asked once and
+    a package found is only listed for the first of them.
+    """
+    providers = {}
+    shared = {}
+    for manager in managers:
+        manager_name = manager["name"]
+        backend = get_backend(manager)
+        if "providers" not in backend:
+            providers[manager_name] = None
+            continue
+
+        key = (backend["snapshot"], manager.get("remote"))
+        if key in shared:
+            found = shared[key]
+            if found:
+                continue
+        else:
+            with span("phase", f"providers:{manager_name}", pkg=pkg):
+                found = shared[key] = backend["providers"](manager, pkg, refresh)
+        # the AUR helpers may still find what the repos don't have
+        providers[manager_name] = None if not found and backend.get("unlisted") else found
+    return providers
+
+
+def provider_managers(include_pip=False) -> list:
+    """The available package managers, optionally with pip added."""
+    managers = list(available_managers())
+    pip = {"name": "pip"}
+    if include_pip and not any(get_backend(m) is get_backend(pip) for m in managers):
+        managers.append(pip)
+    return managers
+
+
+def installed_providers(pkg, managers) -> dict:
+    """Like package_providers, for removing: which of the managers installed pkg."""
+    providers = {}
+    seen = set()
+    for manager in managers:
+        backend = get_backend(manager)
+        if backend["snapshot"] and backend["snapshot"] in seen:
+            continue
+        seen.add(backend["snapshot"])
+
+        installed = list_installed(manager)
+        if installed is None:
+            providers[manager["name"]] = None
+            continue
+        matches = backend.get("matches", same_name)
+        providers[manager["name"]] = [
+            {"name": name, "version": "", "source": "installed", "provides": None}
+            for name in installed
+            if matches(pkg, name, installed)
+        ]
+    return providers
+
+
+def choose_provider(pkg, managers, providers, assume_yes=False) -> dict:
+    """Let the user pick one of several managers for pkg. Without a terminal it is the first."""
+    labels = [
+        f"{m['name']}: {providers[m['name']][0]['source']}/{providers[m['name']][0]['name']}"
+        for m in managers
+    ]
+    print_color(f":: {pkg} is available from {len(managers)} package managers", BLUE)
+    if assume_yes or batch_mode():
+        for label in labels:
+            print(f"   {label}")
+        print_color(f"[INFO] Using {managers[0]['name']}, choose another with --provider", YELLOW)
+        return managers[0]
+    return managers[labels.index(draw_menu(labels))]
+
+
+def route_action(action, pkg, managers, assume_yes=False, refresh=None) -> tuple[list, dict] | None:
+    """
+    Which of the managers perform_action should try for pkg, and the name to give each.
+    A manager known to provide pkg is used alone, from several the user picks one.
+    Otherwise the managers that can't tell are tried in order, and None means none can do it.
+    """
+    if action == "install":
+        providers = package_providers(pkg, managers, refresh=refresh is True)
+    else:
+        providers = installed_providers(pkg, managers)
+
+    known = [m for m in managers if providers.get(m["name"])]
+    if len(known) > 1:
+        known = [choose_provider(pkg, known, providers, assume_yes)]
+    if known:
+        manager_name = known[0]["name"]
+        candidates = providers[manager_name]
+        # with several candidates (a virtual package, apps of the same name) the manager asks itself
+        target = candidates[0]["name"] if len(candidates) == 1 else pkg
+        print_color(f"[provider] {pkg}: {manager_name} ({candidates[0]['source']}/{target})", BLUE)
+        return known, {manager_name: target}
+
+    unknown = [m for m in managers if m["name"] in providers and providers[m["name"]] is None]
+    if not unknown:
+        if action == "install":
+            print_color(f"❌ No configured package manager provides {pkg}.", RED)
+        else:
+            print_color(f"❌ {pkg} is not installed.", RED)
+        return None
+    return unknown, {}
+
+
+def show_providers(pkg, as_json=False, refresh=False) -> int:
+    """`mux which-provider`: every backend that can install pkg. Exit status 1 if none can."""
+    providers = package_providers(pkg, provider_managers(include_pip=True), refresh=refresh)
+    if as_json:
+        print(json.dumps(providers, indent=2))
+    else:
+        for manager_name, candidates in providers.items():
+            if candidates is None:
+                print(f"{manager_name:<8} {paint('unknown', YELLOW)} (can't be checked without trying)")
+            elif not candidates:
+                print(f"{manager_name:<8} -")
+            for candidate in candidates or ():
+                provides = f" (provides {candidate['provides']})" if candidate["provides"] else ""
+                if candidate.get("group"):
+                    provides = f" (group {candidate['group']})"
+                version = f" {candidate['version']}" if candidate["version"] else ""
+                print(
+                    f"{manager_name:<8} {paint(candidate['source'] + '/' + candidate['name'], GREEN)}"
+                    f"{version}{provides}"
+                )
+    return 0 if any(providers.values()) else 1
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# VERSION ENGINE
+# ────────────────────────────────────────────────────────────────────────────────
+
+_local_versions: dict[str, str] | None = None
+_sync_versions: dict[str, tuple] | None = None
+_outdated: list | None = None
+
+
+def invalidate_versions() -> None:
+    """Forget the version data once the local or sync databases changed."""
+    global _local_versions, _sync_versions, _outdated
+    _local_versions = _sync_versions = _outdated = None
+
+
+def _rpmvercmp(a, b) -> int:
+    """Compare two version segments the way libalpm's rpmvercmp does."""
+    if a == b:
+        return 0
+
+    def isalnum(c) -> bool:
+        return c.isascii() and c.isalnum()
+
+    def isdigit(c) -> bool:
+        return c.isascii() and c.isdigit()
+
+    def isalpha(c) -> bool:
+        return c.isascii() and c.isalpha()
+
+    one = two = 0
+    ptr1 = ptr2 = 0
+    len1, len2 = len(a), len(b)
+
+    while one < len1 and two < len2:
+        while one < len1 and not isalnum(a[one]):
+            one += 1
+        while two < len2 and not isalnum(b[two]):
+            two += 1
+
+        if one >= len1 or two >= len2:
+            break
+
+        # a longer run of separators wins
+        if one - ptr1 != two - ptr2:
+            return -1 if one - ptr1 < two - ptr2 else 1
+
+        ptr1, ptr2 = one, two
+        if isdigit(a[ptr1]):
+            while ptr1 < len1 and isdigit(a[ptr1]):
+                ptr1 += 1
+            while ptr2 < len2 and isdigit(b[ptr2]):
+                ptr2 += 1
+            isnum = True
+        else:
+            while ptr1 < len1 and isalpha(a[ptr1]):
+                ptr1 += 1
+            while ptr2 < len2 and isalpha(b[ptr2]):
+                ptr2 += 1
+            isnum = False
+
+        seg1, seg2 = a[one:ptr1], b[two:ptr2]
+        if not seg1:
+            return -1
+        if not seg2:
+            # numeric segments are always newer than alpha segments
+            return 1 if isnum else -1
+
+        if isnum:
+            seg1, seg2 = seg1.lstrip("0"), seg2.lstrip("0")
+            if len(seg1) != len(seg2):
+                return 1 if len(seg1) > len(seg2) else -1
+
+        if seg1 != seg2:
+            return -1 if seg1 < seg2 else 1
+
+        one, two = ptr1, ptr2
+
+    if one >= len1 and two >= len2:
+        return 0
+
+    # "1.0" is newer than "1.0alpha" but older than "1.0.1"
+    if (one >= len1 and not isalpha(b[two])) or (one < len1 and isalpha(a[one])):
+        return -1
+    return 1
+
+
+def _parse_evr(evr) -> tuple[str, str, str | None]:
+    """Split "epoch:version-release" into its parts, epoch defaults to "0"."""
+    digits = 0
+    while digits < len(evr) and evr[digits].isascii() and evr[digits].isdigit():
+        digits += 1
+
+    if digits < len(evr) and evr[digits] == ":":
+        epoch = evr[:digits] or "0"
+        rest = evr[digits + 1:]
+    else:
+        epoch = "0"
+        rest = evr
+
+    version, dash, release = rest.rpartition("-")
+    if not dash:
+        return epoch, rest, None
+    return epoch, version, release
+
+
+def vercmp(a, b) -> int:
+    """Compare two pacman package versions, returns -1, 0 or 1 like `vercmp`."""
+    if a == b:
+        return 0
+
+    epoch1, ver1, rel1 = _parse_evr(a)
+    epoch2, ver2, rel2 = _parse_evr(b)
+
+    ret = _rpmvercmp(epoch1, epoch2)
+    if ret == 0:
+        ret = _rpmvercmp(ver1, ver2)
+        if ret == 0 and rel1 and rel2:
+            ret = _rpmvercmp(rel1, rel2)
+    return ret
+
+
+def local_versions() -> dict:
+    """Map every installed package to its version, read straight from the pacman local database."""
+    global _local_versions
+    if _local_versions is None:
+        versions = {}
+        local_dir = os.path.join(setting("pacman_db_path"), "local")
+        for entry in os.scandir(local_dir) if os.path.isdir(local_dir) else ():
+            if not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, "desc"), encoding="utf-8", errors="replace") as f:
+                    fields = parse_desc(f.read())
+            except OSError:
+                continue
+            if fields.get("NAME") and fields.get("VERSION"):
+                versions[fields["NAME"][0]] = fields["VERSION"][0]
+        _local_versions = versions
+    return _local_versions
+
+
+def sync_repo_order() -> list:
+    """The repositories in pacman.conf order, which decides which one provides a package."""
+    repos = []
+    try:
+        with open(setting("pacman_conf"), encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("[") and line.endswith("]") and line != "[options]":
+                    repos.append(line[1:-1])
+    except OSError:
+        pass
+    return repos
+
+
+def sync_versions() -> dict:
+    """Map every package in the sync databases to (repo, version) of the repo pacman would use."""
+    global _sync_versions
+    if _sync_versions is None:
+        conn = get_index()
+        refresh_index(conn)
+        rows = conn.execute("SELECT repo, name, version FROM packages").fetchall()
+
+        order = {repo: i for i, repo in enumerate(sync_repo_order())}
+        rows.sort(key=lambda row: (order.get(row[0], len(order)), row[0]), reverse=True)
+        # later rows overwrite earlier ones, so the highest priority repo is written last
+        _sync_versions = {name: (repo, version) for repo, name, version in rows}
+    return _sync_versions
+
+
+def outdated_packages() -> list:
+    """Return (name, installed version, repo, available version) for every stale package."""
+    global _outdated
+    if _outdated is None:
+        available = sync_versions()
+        outdated = []
+        for name, installed_version in sorted(local_versions().items()):
+            if name not in available:
+                continue
+            repo, version = available[name]
+            if vercmp(version, installed_version) > 0:
+                outdated.append((name, installed_version, repo, version))
+        _outdated = outdated
+    return _outdated
+
+
+def show_outdated() -> None:
+    outdated = outdated_packages()
+    if not outdated:
+        print_color("Everything is up-to-date.", GREEN)
+        return
+
+    width = max(len(name) for name, *_ in outdated)
+    for name, installed_version, repo, version in outdated:
+        print(f"{name.ljust(width)}  {installed_version} -> {paint(version, GREEN)}  ({repo})")
+    print_color(f"{len(outdated)} package(s) can be updated.", YELLOW)
+
+
+def search_command(manager, pkg) -> list | None:
+    backend = get_backend(manager)
+    if manager.get("search_unlisted"):
+        return backend["search_unlisted"](manager, pkg)
+    return backend["search"](manager, pkg)
+
+
+def search_managers() -> list:
+    """
+    The available managers to search. Managers sharing a snapshot list the same packages,
+    so only the first of them searches everything. An AUR helper after it only searches
+    what it adds, the AUR, and only the first such helper does.
+    """
+    managers = []
+    unlisted_searched = set()
+    for manager in available_managers():
+        backend = get_backend(manager)
+        snapshot = backend["snapshot"]
+        if snapshot and any(get_backend(m)["snapshot"] == snapshot for m in managers):
+            if "search_unlisted" not in backend or snapshot in unlisted_searched:
+                continue
+            manager = dict(manager, search_unlisted=True)
+        if backend.get("unlisted"):
+            unlisted_searched.add(snapshot)
+        if search_command(manager, "") is not None:
+            managers.append(manager)
+    return managers
+
+
+async def stream_search(manager_name, cmd, timeout) -> int:
+    """Print a backend's search results as they arrive, giving up after `timeout` seconds."""
+    import asyncio
+    import signal
+
+    with span("subprocess", manager_name, argv=list(cmd)):
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # own process group, so a timeout also stops whatever the backend spawned
+            start_new_session=True,
+        )
+        tag = paint(f"[{manager_name}]", BLUE)
+
+        async def pump() -> int:
+            async for raw in proc.stdout:
+                line = raw.decode(errors="replace").rstrip()
+                if not line:
+                    continue
+                if line[0].isspace():
+                    # description lines belong to the result above them
+                    print(f"{tag} {line}", flush=True)
+                else:
+                    print(f"{tag} \033[1;34m{line}\033[0m", flush=True)
+            return await proc.wait()
+
+        try:
+            return await asyncio.wait_for(pump(), timeout)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            print_color(f"[{manager_name}] search timed out after {timeout}s", YELLOW)
+            return 1
+
+
+async def search_all(searches) -> None:
+    """Run the (label, manager, term) searches at once."""
+    import asyncio
+
+    await asyncio.gather(
+        *(
+            stream_search(
+                label,
+                search_command(m, pkg),
+                m.get("search_timeout", setting("search_timeout")),
+            )
+            for label, m, pkg in searches
+        )
+    )
+
+
+def search_pkg(*pkgs) -> None:
+    """Search for one or more packages in every available package manager at once."""
+    import asyncio
+
+    managers = search_managers()
+    if not managers:
+        print_color("❌ No supported package manager found (pacman, yay, paru, flatpak).", RED)
+        return
+
+    names = ", ".join(m["name"] for m in managers)
+    terms = ", ".join(f'"{pkg}"' for pkg in pkgs)
+    print_color(f"🔍 Searching for {terms} with {names}...", GREEN)
+
+    # pacman is answered from the local index and flatpak from its cached remote catalog,
+    # the others, and the terms those can't answer, are searched live
+    live = []
+    for pkg in pkgs:
+        for manager in managers:
+            # with several terms the tag also says which one a result is for
+            label = manager["name"] if len(pkgs) == 1 else f"{manager['name']} {pkg}"
+            cached = get_backend(manager).get("search_cached")
+            if not (cached and cached(manager, pkg, label)):
+                live.append((label, manager, pkg))
+
+    if live:
+        asyncio.run(search_all(live))
+
+
+def edit_config() -> None:
+    import subprocess
+
+    os.makedirs(os.path.dirname(get_config_path()), exist_ok=True)
+    subprocess.run([setting("editor"), get_config_path()], check=False)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DOWNLOAD RELATED FUNCTIONS
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+# Directories that never hold the project's own sources
+SKIP_DIRS = {"__pycache__", "node_modules", "site-packages", "venv", ".venv", "env", "build", "dist"}
+
+# Below this many changed files parsing inline beats starting a process pool
+PARALLEL_SCAN_THRESHOLD = 64
+
+_stdlib_modules: set | None = None
+
+
+def get_stdlib_modules() -> set:
+    global _stdlib_modules
+    if _stdlib_modules is not None:
+        return _stdlib_modules
+
+    if hasattr(sys, "stdlib_module_names"):
+        _stdlib_modules = set(sys.stdlib_module_names)
+        return _stdlib_modules
+
+    # Python < 3.10: walk the stdlib once per interpreter and keep the result
+    import sysconfig
+
+    stdlib_path = sysconfig.get_paths()["stdlib"]
+    key = f"{sys.version}:{stdlib_path}"
+    cache = load_cache("stdlib.json")
+    if cache.get("key") == key:
+        _stdlib_modules = set(cache["modules"])
+        return _stdlib_modules
+
+    modules = set(sys.builtin_module_names)
+    for root, dirs, files in os.walk(stdlib_path):
+        dirs[:] = [d for d in dirs if d != "site-packages"]
+        for name in files:
+            if name.endswith(".py"):
+                rel_path = os.path.relpath(os.path.join(root, name), stdlib_path)
+                mod = rel_path.replace("/", ".").replace("\\", ".").removesuffix(".py")
+                modules.add(mod.split(".")[0])
+        for name in dirs:
+            modules.add(name.split(".")[0])
+
+    save_cache("stdlib.json", {"key": key, "modules": sorted(modules)})
+    _stdlib_modules = modules
+    return modules
+
+
+def get_imports(file_path) -> set:
+    import ast
+
+    with open(file_path, "rb") as f:
+        tree = ast.parse(f.read(), filename=file_path)
+
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for n in node.names:
+                imports.add(n.name.split(".")[0])
+        elif isinstance(node, ast.ImportFrom):
+            # relative imports always point inside the project
+            if node.module and not node.level:
+                imports.add(node.module.split(".")[0])
+    return imports
+
+
+def scan_file(file_path) -> list:
+    """Process pool worker: the imports of one file, or nothing if it can't be parsed."""
+    try:
+        return sorted(get_imports(file_path))
+    except (OSError, SyntaxError, ValueError):
+        return []
+
+
+def find_python_files(path) -> list:
+    if os.path.isfile(path):
+        return [os.path.abspath(path)]
+
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS]
+        for name in files:
+            if name.endswith(".py"):
+                found.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(found)
+
+
+def local_module_names(files) -> set:
+    """Top level names the project provides itself, these are never installed."""
+    names = set()
+    for file_path in files:
+        parent, name = os.path.split(file_path)
+        names.add(name.removesuffix(".py"))
+        if name == "__init__.py":
+            names.add(os.path.basename(parent))
+    return names
+
+
+def scan_imports(path) -> set:
+    """
+    Collect the top level imports of a file or a whole project tree.
+    Results are cached per file by mtime and size, so only changed files are parsed again.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with span("phase", "scan_imports", path=path):
+        files = find_python_files(path)
+        cache = load_cache("imports.json")
+        imports = set()
+        changed = []
+
+        for file_path in files:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            entry = cache.get(file_path)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                imports.update(entry[2])
+            else:
+                changed.append((file_path, st.st_mtime_ns, st.st_size))
+
+        if changed:
+            paths = [file_path for file_path, _, _ in changed]
+            if len(changed) >= PARALLEL_SCAN_THRESHOLD:
+                with ProcessPoolExecutor() as pool:
+                    results = list(pool.map(scan_file, paths, chunksize=16))
+            else:
+                results = [scan_file(file_path) for file_path in paths]
+
+            for (file_path, mtime, size), file_imports in zip(changed, results):
+                cache[file_path] = [mtime, size, file_imports]
+                imports.update(file_imports)
+
+            # forget files that were deleted from the tree we just scanned
+            root = os.path.abspath(path)
+            for file_path in list(cache):
+                if file_path.startswith(root) and not os.path.exists(file_path):
+                    del cache[file_path]
+            save_cache("imports.json", cache)
+
+        return imports - local_module_names(files)
+
+
+def detect_stdlib_imports(path) -> dict:
+    stdlib = get_stdlib_modules()
+    imports = scan_imports(path)
+
+    result = {}
+    for imp in imports:
+        result[imp] = imp in stdlib
+    return result
+
+
+def detect_imports(path) -> list[str]:
+    """The third party imports of a file or project, the ones pip has to provide."""
+    imports = []
+    for name, is_std in detect_stdlib_imports(path).items():
+        if not is_std:
+            imports.append(name)
+    return sorted(imports)
+
+
+# Imports whose distribution on PyPI has a different name.
+# Extend or override it with "import_map" in the config.
+IMPORT_TO_DIST = {
+    "attr": "attrs",
+    "bs4": "beautifulsoup4",
+    "Crypto": "pycryptodome",
+    "cv2": "opencv-python",
+    "dateutil": "python-dateutil",
+    "docx": "python-docx",
+    "dotenv": "python-dotenv",
+    "fitz": "PyMuPDF",
+    "gi": "PyGObject",
+    "git": "GitPython",
+    "jwt": "PyJWT",
+    "kafka": "kafka-python",
+    "ldap": "python-ldap",
+    "Levenshtein": "python-Levenshtein",
+    "magic": "python-magic",
+    "MySQLdb": "mysqlclient",
+    "OpenSSL": "pyOpenSSL",
+    "PIL": "Pillow",
+    "pkg_resources": "setuptools",
+    "pptx": "python-pptx",
+    "psycopg2": "psycopg2-binary",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "telegram": "python-telegram-bot",
+    "usb": "pyusb",
+    "websocket": "websocket-client",
+    "wx": "wxPython",
+    "yaml": "PyYAML",
+    "zmq": "pyzmq",
+}
+
+
+def resolve_imports(imports) -> tuple[list, list]:
+    """
+    Map import names to the distributions that provide them.
+    Returns (distributions to install, imports that are already satisfied).
+    """
+    import importlib.metadata
+
+    # which distribution provides an import is only known for mux's own interpreter
+    installed = importlib.metadata.packages_distributions() if pip_targets_self() else {}
+    mapping = {**IMPORT_TO_DIST, **setting("import_map")}
+
+    missing = []
+    satisfied = []
+    for name in imports:
+        if name in installed:
+            satisfied.append(name)
+            continue
+        dist = mapping.get(name, name)
+        if pip_installed(dist):
+            satisfied.append(name)
+        elif dist not in missing:
+            missing.append(dist)
+    return missing, satisfied
+
+
+def pip_command() -> list:
+    """pip of the interpreter mux installs for, the "python" setting or the one running mux."""
+    return [setting("python") or sys.executable, "-m", "pip"]
+
+
+def download_imports(path) -> int:
+    """`mux download`: pip install what the imports under path need. Returns pip's exit code."""
+    if not os.path.exists(path):
+        print_color(f"❌ No such file or directory: '{path}'", RED)
+        return 1
+
+    missing, satisfied = resolve_imports(detect_imports(path))
+    for name in satisfied:
+        print_color(f"[skip] '{name}' is already installed", YELLOW)
+
+    if not missing:
+        print_color("All imports are already satisfied.", GREEN)
+        return 0
+
+    # one resolver run for everything
+    status = run_cmd([*pip_command(), "install", *missing])
+    invalidate_snapshot("pip")
+    if status != 0:
+        print_color(f"❌ pip could not install: {' '.join(missing)}", RED)
+    return status
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# NETWORK
+# ────────────────────────────────────────────────────────────────────────────────
+
+# pooled sessions, one retrying transient failures and one that doesn't
+_sessions: dict[bool, "requests.Session"] = {}
+
+
+def get_session(retry=True) -> "requests.Session":
+    """One pooled session for every request mux makes, retrying transient failures unless retry is False."""
+    import requests
+
+    if retry not in _sessions:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retries = Retry(
+            total=setting("http_retries"),
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+        ) if retry else 0
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = "mux"
+        _sessions[retry] = session
+    return _sessions[retry]
+
+
+def http_get(
+    url, cache_key=None, headers=None, params=None, timeout=None, retry=True
+) -> tuple[int, bytes]:
+    """
+    GET a url and return (status code, body); status 0 means the request itself failed.
+    With a cache_key the body is kept on disk and revalidated with If-None-Match,
+    so an unchanged file is never downloaded twice.
+    timeout defaults to "http_timeout", and retry=False gives up after the first failure.
+    """
+    import hashlib
+    import requests
+
+    headers = dict(headers or {})
+    meta_path = body_path = None
+    meta = {}
+
+    if cache_key:
+        http_dir = os.path.join(get_cache_dir(), "http")
+        os.makedirs(http_dir, exist_ok=True)
+        digest = hashlib.sha256(cache_key.encode()).hexdigest()
+        meta_path = os.path.join(http_dir, f"{digest}.json")
+        body_path = os.path.join(http_dir, f"{digest}.body")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("etag") and os.path.exists(body_path):
+                headers["If-None-Match"] = meta["etag"]
+        except (OSError, ValueError):
+            meta = {}
+
+    with span("http", url.split("/")[2], url=url) as info:
+        try:
+            response = get_session(retry).get(
+                url, headers=headers, params=params, timeout=timeout or setting("http_timeout")
+            )
+        except requests.RequestException as e:
+            info["error"] = str(e)
+            print_color(f"[Error] Request to {url} failed: {e}", RED)
+            return (0, b"")
+        info["status"] = response.status_code
+
+    if response.status_code == 304 and "If-None-Match" in headers:
+        with open(body_path, "rb") as f:
+            return (200, f.read())
+
+    if response.status_code == 200 and cache_key and response.headers.get("ETag"):
+        with open(body_path, "wb") as f:
+            f.write(response.content)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"key": cache_key, "etag": response.headers["ETag"]}, f)
+
+    return (response.status_code, response.content)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BUILD RELATED FUNCTIONS
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def flatpak_installed(app) -> bool:
+    """Whether the app with exactly this ID is installed, is_installed also finds it by name."""
+    return app in (installed_set("flatpak") or {})
+
+
+_specifier_set: Any = None
+
+
+def split_requirement(requirement) -> tuple[str, str]:
+    """'requests[socks] >= 2.31; python_version > "3"' -> ('requests', '>= 2.31'). Markers are ignored."""
+    requirement = requirement.split(";")[0].strip()
+    match = re.match(r"([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(.*)", requirement)
+    if not match:
+        return requirement, ""
+    return match.group(1), match.group(2).strip()
+
+
+def load_specifier_set() -> Any:
+    """packaging's SpecifierSet, from packaging itself or pip's vendored copy, or None."""
+    global _specifier_set
+    if _specifier_set is None:
+        import importlib
+
+        _specifier_set = False
+        for module in ("packaging.specifiers", "pip._vendor.packaging.specifiers"):
+            try:
+                _specifier_set = importlib.import_module(module).SpecifierSet
+                break
+            except ImportError:
+                continue
+    return _specifier_set or None
+
+
+def release_numbers(version) -> tuple:
+    """'1.10.0rc1' -> (1, 10, 0): the release part, all the fallback comparison looks at."""
+    match = re.match(r"\s*v?(\d+(?:\.\d+)*)", version)
+    return tuple(int(part) for part in match.group(1).split(".")) if match else ()
+
+
+def compare_releases(a, b) -> int:
+    width = max(len(a), len(b))
+    a = a + (0,) * (width - len(a))
+    b = b + (0,) * (width - len(b))
+    return (a > b) - (a < b)
+
+
+def specifier_satisfied(specifier, version) -> bool:
+    """Whether an installed version meets a PEP 440 specifier like '>=2.31,<3'."""
+    if not specifier:
+        return True
+    if version is None:
+        return False
+
+    SpecifierSet = load_specifier_set()
+    if SpecifierSet is not None:
+        try:
+            return SpecifierSet(specifier).contains(version, prereleases=True)
+        except ValueError:
+            # an invalid specifier or a legacy version, compare the release numbers instead
+            pass
+
+    installed = release_numbers(version)
+    for clause in specifier.split(","):
+        match = re.match(r"\s*(===|==|!=|~=|>=|<=|>|<)\s*(\S+)\s*$", clause)
+        if not match:
+            return False
+        op, wanted = match.groups()
+        if op in ("==", "!=") and wanted.endswith(".*"):
+            prefix = release_numbers(wanted[:-2])
+            matches = compare_releases(installed[:len(prefix)], prefix) == 0
+            ok = matches if op == "==" else not matches
+        elif op == "===":
+            ok = version == wanted
+        elif op == "~=":
+            wanted_release = release_numbers(wanted)
+            ok = (
+                compare_releases(installed, wanted_release) >= 0
+                and compare_releases(installed[:len(wanted_release) - 1], wanted_release[:-1]) == 0
+            )
+        else:
+            result = compare_releases(installed, release_numbers(wanted))
+            ok = {
+                "==": result == 0, "!=": result != 0, ">=": result >= 0,
+                "<=": result <= 0, ">": result > 0, "<": result < 0,
+            }[op]
+        if not ok:
+            return False
+    return True
+
+
+def pip_installed(pkg) -> bool:
+    """pkg can be a requirement like "requests>=2.31", checked against the installed version."""
+    name, specifier = split_requirement(pkg)
+    installed = installed_set("pip") or {}
+    version = installed.get(normalize_dist_name(name), False)
+    if version is False:
+        return False
+    return specifier_satisfied(specifier, version)
+
+
+def is_stdlib_module(name) -> bool:
+    # only the top-level name matters, and nothing gets imported to find out
+    return split_requirement(name)[0].split(".")[0] in get_stdlib_modules()
+
+
+def view(owner, repo, path, branch="main", token=None) -> str | int:
+    """
+    Fetch and return content of a file from GitHub via API.
+    Returns the decoded text, or an integer HTTP status code if not 200.
+    """
+    import base64
+
+    status, data = view_entry(owner, repo, path, branch, token)
+    if status == 200 and data.get("type") == "file":
+        return base64.b64decode(data["content"]).decode()
+    return status
+
+
+def view_entry(owner, repo, path, branch="main", token=None, quick=False) -> tuple[int, dict]:
+    """
+    The GitHub contents API entry of a path, with its git SHA: (HTTP status, entry or {}).
+    quick only waits "check_timeout" seconds, and doesn't retry.
+    """
+    github_api = os.environ.get("MUX_GITHUB_API") or setting("github_api")
+    url = f"{github_api}/repos/{owner}/{repo}/contents/{path}"
+    headers = {}
+    params = {"ref": branch}
+    if token:
+        headers["Authorization"] = f"token {token}"
+
+    with span("phase", "view", path=f"{owner}/{repo}/{path}"):
+        status, body = http_get(
+            url, cache_key=f"{owner}/{repo}/{path}@{branch}", headers=headers, params=params,
+            timeout=setting("check_timeout") if quick else None, retry=not quick,
+        )
+    if status == 200:
+        return status, json.loads(body)
+    return status, {}
+
+def fetch_installer(repo_url, file, token=None, quick=False) -> tuple[int, dict]:
+    """
+    Fetch a git installer's contents API entry: (HTTP status, entry), status 0 for a bad URL.
+    quick is passed on to view_entry.
+    """
+    try:
+        if repo_url.startswith("git@github.com:"):
+            path = repo_url.split("git@github.com:")[1]
+        elif repo_url.startswith("https://github.com/"):
+            path = repo_url.split("github.com/")[1]
+        else:
+            print_color(f"[Error] Unsupported repo URL format: {repo_url}", RED)
+            return 0, {}
+
+        if path.endswith(".git"):
+            path = path[:-4]
+
+        owner, repo_name = path.split("/")[:2]
+
+    except Exception as e:
+        print_color(f"[Error] Could not parse repo URL '{repo_url}': {e}", RED)
+        return 0, {}
+
+    return view_entry(owner, repo_name, file, token=token, quick=quick)
+
+
+def installer_shas(items, token=None) -> dict:
+    """
+    {key: the upstream git SHA, None when it can't be had} for (key, git entry) pairs.
+    They are all asked at once, each with a short timeout and no retries, so a plan
+    made offline doesn't wait for one installer after the other.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def sha(item) -> str | None:
+        status, entry = fetch_installer(item["repo"], item["file"], token=token, quick=True)
+        return entry.get("sha") if status == 200 else None
+
+    if not items:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(items), 8)) as pool:
+        return dict(zip([key for key, _ in items], pool.map(sha, [item for _, item in items])))
+
+
+# What a git installer gets of mux's environment, plus the MUX_* variables.
+# Everything else mux was started with (tokens, PYTHONPATH, a virtualenv, ...) stays behind.
+INSTALLER_ENV = (
+    "PATH", "HOME", "USER", "LOGNAME", "LANG", "LANGUAGE", "LC_ALL", "TERM", "DISPLAY",
+    "WAYLAND_DISPLAY", "XDG_RUNTIME_DIR", "XDG_CONFIG_HOME", "XDG_CACHE_HOME", "XDG_DATA_HOME",
+    "SUDO_ASKPASS", "http_proxy", "https_proxy", "no_proxy", "HTTP_PROXY", "HTTPS_PROXY",
+    "NO_PROXY", "SSL_CERT_FILE", "REQUESTS_CA_BUNDLE",
+)
+
+# Runs in the installer's own process. Installers were written to run inside mux, so
+# they get a fresh copy of mux (print_color, run_cmd, setting, ...) as their globals.
+INSTALLER_BOOTSTRAP = """\
+import importlib.machinery, importlib.util, os, sys
+# mux imports muxcli, which lies next to it
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+# mux may be a copy without the .py suffix spec_from_file_location picks a loader by
+loader = importlib.machinery.SourceFileLoader("mux", sys.argv[1])
+spec = importlib.util.spec_from_file_location("mux", sys.argv[1], loader=loader)
+mux = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mux)
+path = sys.argv[2]
+sys.argv = [path]
+namespace = dict(vars(mux), __name__="__main__")
+# installers predate color names: to them GREEN, RED, ... are the escape codes
+colors = mux.get_config().get("colors", {})
+for color in (mux.GREEN, mux.YELLOW, mux.RED, mux.BLUE, mux.RESET):
+    namespace[color] = colors.get(color, "")
+with open(path, encoding="utf-8") as f:
+    exec(compile(f.read(), path, "exec"), namespace)
+"""
+
+
+def run_installer(content, name, timeout=None) -> dict:
+    """
+    Run a git installer in a python process of its own, so a slow or broken one can't
+    stall the build or change mux's state. It starts with a clean environment and is
+    killed after `timeout` seconds ("installer_timeout").
+    Its output goes to a log file, and is shown prefixed like any build job unless mux
+    runs headless. A serial build on a terminal hands it the terminal instead, in case
+    it asks something.
+    Returns {"status", "timed_out", "duration", "log"}, log being None on the terminal.
+    """
+    import signal
+    import subprocess
+    import tempfile
+
+    if timeout is None:
+        timeout = setting("installer_timeout")
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key in INSTALLER_ENV or key.startswith("MUX_")
+    }
+    fd, script = tempfile.mkstemp(prefix="mux-installer-", suffix=".py")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+    cmd = [sys.executable, "-c", INSTALLER_BOOTSTRAP, os.path.abspath(__file__), script]
+
+    batch = batch_mode()
+    on_terminal = not batch and not current_job()
+    log_path = None if on_terminal else next_log_path([name.replace("/", "_")])
+    timed_out = threading.Event()
+    start = time.perf_counter()
+
+    with span("subprocess", "installer", argv=[name]) as info:
+        log = open(log_path, "w", encoding="utf-8") if log_path else None
+        try:
+            if log:
+                log.write(f"$ {name}\n")
+                log.flush()
+            proc = subprocess.Popen(
+                cmd,
+                env=env,
+                stdin=None if on_terminal else subprocess.DEVNULL,
+                stdout=None if on_terminal else log if batch else subprocess.PIPE,
+                stderr=None if on_terminal else subprocess.STDOUT,
+                text=True,
+                errors="replace",
+                # its own process group, so a timeout also kills what it started
+                start_new_session=not on_terminal,
+            )
+
+            def kill() -> None:
+                timed_out.set()
+                try:
+                    if on_terminal:
+                        proc.kill()
+                    else:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            timer = threading.Timer(timeout, kill) if timeout else None
+            if timer:
+                timer.daemon = True
+                timer.start()
+            if proc.stdout:
+                for line in proc.stdout:
+                    log.write(line)
+                    with _print_lock:
+                        print(f"{job_prefix()}{line.rstrip()}", flush=True)
+            status = exit_code(proc.wait())
+            if timer:
+                timer.cancel()
+        finally:
+            if log:
+                log.close()
+            os.unlink(script)
+        if timed_out.is_set():
+            # like timeout(1)
+            status = 124
+        info["exit_code"] = status
+    elapsed = time.perf_counter() - start
+
+    if batch:
+        label = current_job() or name
+        mark, color = ("✔", GREEN) if status == 0 else ("✘", RED)
+        with _print_lock:
+            print(
+                f"[{label}] {paint(f'{mark} {name}', color)} "
+                f"(exit {status}, {elapsed:.1f}s, log: {log_path})",
+                flush=True,
+            )
+            if status != 0:
+                for line in log_tail(log_path):
+                    print(f"[{label}] | {line}", flush=True)
+    if timed_out.is_set():
+        print_color(f"[ERROR] {name} took longer than {timeout}s and was stopped", RED)
+    elif status != 0 and not batch:
+        print_color(f"[ERROR] {name} failed with exit code {status}", RED)
+
+    return {
+        "status": status,
+        "timed_out": timed_out.is_set(),
+        "duration": round(elapsed, 3),
+        "log": log_path,
+    }
+
+
+def handle_git(repo_url, file, token=None, entry=None, timeout=None) -> dict:
+    """
+    Fetch /mux/installer.py from a GitHub repo via the API, never cloning, and run it
+    with run_installer(). `entry` is the installer when it was already fetched by the
+    prefetch stage.
+    Returns run_installer()'s result and the git "sha" of the installer, which is None
+    (status 1) when it could not be fetched.
+    """
+    import base64
+
+    if entry is None:
+        status, data = fetch_installer(repo_url, file, token=token)
+    else:
+        status, data = 200, entry
+    if status != 200 or data.get("type") != "file":
+        print_color(
+            f"[Error] /mux/installer.py not found or failed to fetch. status_code: {status}",
+            RED,
+        )
+        return {"status": 1, "timed_out": False, "duration": 0.0, "log": None, "sha": None}
+
+    content = base64.b64decode(data["content"]).decode()
+    name = f"{repo_url.rstrip('/').split('/')[-1]}/{file}"
+    print_color(f"Running {name}...", GREEN)
+    with span("phase", "git", repo=repo_url, file=file):
+        result = run_installer(content, name, timeout=timeout)
+    return dict(result, sha=data.get("sha"))
+
+
+def run_jobs(jobs, max_workers=1) -> dict:
+    """
+    Run build jobs and return {job name: exit status}.
+    Each job is a dict with "name", "run" (a callable returning an exit status),
+    "after" (names of jobs that must finish first) and "resource" (jobs sharing
+    a resource, like the pacman database, never run at the same time).
+    With max_workers == 1 the jobs run one by one in the given order on the terminal.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    results = {}
+
+    def run_job(job) -> int:
+        try:
+            return job["run"]()
+        except Exception as e:
+            # one broken job must not stop the others, or the lock file from being written
+            print_color(f"❌ {e}", RED)
+            return 1
+
+    if max_workers <= 1:
+        for job in jobs:
+            results[job["name"]] = run_job(job)
+        return results
+
+    def run_named_job(job) -> int:
+        _job_context.name = job["name"]
+        try:
+            return run_job(job)
+        finally:
+            _job_context.name = None
+
+    pending = list(jobs)
+    running = {}
+    busy = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= max_workers:
+                    break
+                if any(dep not in results for dep in job["after"]):
+                    continue
+                if job["resource"] in busy:
+                    continue
+                pending.remove(job)
+                if job["resource"]:
+                    busy.add(job["resource"])
+                running[pool.submit(run_named_job, job)] = job
+
+            if not running:
+                # only jobs waiting on something that will never finish are left
+                for job in pending:
+                    print_color(f"[ERROR] job '{job['name']}' has unmet dependencies", RED)
+                    results[job["name"]] = 1
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                busy.discard(job["resource"])
+                results[job["name"]] = future.result()
+
+    return results
+
+
+def flatpak_remote(manager=None) -> str:
+    """The remote a flatpak manager installs from, by default the first configured one's."""
+    if manager is not None:
+        return manager.get("remote", "flathub")
+    for manager in package_managers():
+        if manager.get("name") == "flatpak":
+            return manager.get("remote", "flathub")
+    return "flathub"
+
+
+def install_batch(label, cmd, names, is_present, sudo=False, snapshot=None) -> tuple[list, int]:
+    """
+    Install all names with a single command, retrying one at a time only for what the batch missed.
+    label names the manager in messages, snapshot is the installed snapshot the command changes.
+    Returns the names that could not be installed and the exit code of the last failed command.
+    """
+    if not names:
+        return [], 0
+
+    status = run_cmd(cmd + names, sudo=sudo)
+    if snapshot:
+        invalidate_snapshot(snapshot)
+    if status == 0:
+        return [], 0
+
+    remaining = [name for name in names if not is_present(name)]
+    if len(names) == 1:
+        return remaining, status
+
+    print_color(
+        f"[WARN] {label} batch failed, retrying {len(remaining)} package(s) one at a time", YELLOW
+    )
+
+    failed = []
+    last_status = 0
+    for name in remaining:
+        retry_status = run_cmd(cmd + [name], sudo=sudo)
+        if retry_status != 0:
+            failed.append(name)
+            last_status = retry_status
+    if snapshot:
+        invalidate_snapshot(snapshot)
+    return failed, last_status
+
+
+LOCK_VERSION = 1
+
+
+def lock_path(muxfile_path) -> str:
+    return f"{muxfile_path}.lock"
+
+
+def load_lock(muxfile_path) -> dict:
+    """What the last build of a muxFile did, or {} if it was never built."""
+    try:
+        with open(lock_path(muxfile_path), encoding="utf-8") as f:
+            lock = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return lock if lock.get("version") == LOCK_VERSION else {}
+
+
+def save_lock(muxfile_path, lock) -> None:
+    path = lock_path(muxfile_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(lock, f, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print_color(f"[WARN] Could not write {path}: {e}", YELLOW)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def content_hash(value) -> str:
+    """SHA-256 of any JSON value, independent of key order."""
+    import hashlib
+
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def entry_names(item) -> list:
+    """The package names a muxFile entry installs."""
+    if item["type"] == "pacman":
+        return [item["name"]]
+    if item["type"] == "flatpak":
+        return list(item["apps"])
+    if item["type"] == "pip":
+        return list(item["modules"])
+    return []
+
+
+def backend_states() -> dict:
+    """A hash per backend that changes whenever something is installed or removed."""
+    return {
+        backend: content_hash(path_signature(state_paths()))
+        for backend, (state_paths, _) in SNAPSHOT_SOURCES.items()
+    }
+
+
+def resolved_version(backend, name) -> str | None:
+    version = get_backend({"name": backend}).get("version")
+    return version(name) if version else None
+
+
+def confirm_build(plan, assume_yes=False) -> bool:
+    if setting("show_warning"):
+        # confirm the user input
+        print_color(
+            f"[WARNING] If you do not trust this file, DO NOT install anything.", YELLOW
+        )
+        print_color(
+            f"[WARNING] Please review the documentation before proceeding.", YELLOW
+        )
+
+    print_color(f"[INFO]    Docs: {plan['docs']}\n", YELLOW)
+    if assume_yes:
+        inp = True
+    elif batch_mode():
+        # there is no terminal to draw the menu on
+        print_color("[ERROR] Without a terminal the build needs --yes to proceed", RED)
+        return False
+    else:
+        print_color(":: Proceed with installation?", BLUE)
+        inp = False if draw_menu(["Yes", "No"]) == "No" else True
+
+    if not inp:
+        print_color("\n[INFO] User aborted installation", RED)
+    return inp
+
+
+def download_sizes(names) -> dict:
+    """
+    The download size of each pacman package, from the sync database of the repo
+    pacman would install it from, or None when no sync database has it.
+    """
+    available = sync_versions()
+    conn = get_index()
+    sizes = dict.fromkeys(names)
+    names = list(names)
+    # stay below SQLite's limit on query parameters
+    for i in range(0, len(names), 500):
+        chunk = names[i:i + 500]
+        rows = conn.execute(
+            f"SELECT repo, name, csize FROM packages WHERE name IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for repo, name, csize in rows:
+            if available.get(name, (None,))[0] == repo:
+                sizes[name] = csize
+    return sizes
+
+
+def format_size(size) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def plan_build(path, force=False, token=None) -> dict | None:
+    """
+    Work out what building a muxFile would do, without changing anything: which
+    packages each backend installs or skips, which git installers run, and how much
+    pacman would download. Everything is answered from the installed snapshots and
+    the search index, so planning spawns at most one listing command per backend.
+    Git installers that already ran are looked up to see whether they changed.
+    Returns None if the muxFile is invalid.
+    """
+    with open(path) as f:
+        muxfile: dict = json.load(f)
+    required = ["packages", "docs"]
+
+    # run checks to verify the muxfile
+    for key in required:
+        if key not in muxfile:
+            print_color(f"[ERROR] {path} is missing required key: '{key}'", RED)
+            return None
+
+    lock = {} if force else load_lock(path)
+    locked = lock.get("entries", {})
+    unchanged_backends = {
+        backend
+        for backend, signature in backend_states().items()
+        if lock.get("state", {}).get(backend) == signature
+    }
+
+    backends = {
+        "pacman": {"install": [], "skip": []},
+        "flatpak": {"install": [], "skip": []},
+        "pip": {"install": [], "skip": [], "stdlib": []},
+    }
+    git_items = []
+    unknown = []
+    seen = set()
+    keys = []
+    # entry hash -> what the new lock file records about it
+    entries = {}
+    checked = []
+    unchanged = 0
+
+    def classify(backend, name) -> None:
+        part = backends[backend]
+        if name in part["install"] or name in part["skip"]:
+            return
+        installed = query_many(muxfile_manager(backend), [name])[name]
+        part["skip" if installed else "install"].append(name)
+
+    for item in muxfile["packages"]:
+        key = content_hash(item)
+        keys.append(key)
+        if key in locked and item["type"] in unchanged_backends:
+            # built before, and nothing was installed or removed since
+            entries[key] = locked[key]
+            unchanged += 1
+
+        elif item["type"] == "pacman":
+            classify("pacman", item["name"])
+
+        elif item["type"] == "flatpak":
+            for app in item["apps"]:
+                classify("flatpak", app)
+
+        elif item["type"] == "pip":
+            for mod in item["modules"]:
+                if is_stdlib_module(mod):
+                    if mod not in backends["pip"]["stdlib"]:
+                        backends["pip"]["stdlib"].append(mod)
+                else:
+                    classify("pip", mod)
+
+        elif item["type"] == "git":
+            # an installer may rely on any package listed before it
+            git_items.append((key, item, set(seen)))
+
+        else:
+            unknown.append(item["type"])
+
+        if item["type"] in backends and key not in entries:
+            checked.append([key, item])
+        seen.add(item["type"])
+
+    busy = {backend for backend, part in backends.items() if part["install"]}
+    # an installer that already ran, with nothing it may rely on changed, only runs again
+    # when it changed upstream (asked with the ETag, so usually a 304)
+    shas = installer_shas(
+        [
+            (key, item)
+            for key, item, before in git_items
+            if key in locked and locked[key].get("sha") and not before & busy
+        ],
+        token=token,
+    )
+    git = []
+    for key, item, before in git_items:
+        after = sorted(before & busy)
+        run = True
+        changed = False
+        if key in shas:
+            changed = shas[key] is not None and shas[key] != locked[key]["sha"]
+            run = changed
+        if not run:
+            entries[key] = locked[key]
+            unchanged += 1
+        git.append({
+            "name": f"git:{item['repo'].rstrip('/').split('/')[-1]}/{item['file']}",
+            "repo": item["repo"],
+            "file": item["file"],
+            "after": after,
+            "run": run,
+            "changed": changed,
+            "key": key,
+            "timeout": item.get("timeout"),
+        })
+
+    # an app the remote doesn't offer would only fail the whole batch
+    flatpak = backends["flatpak"]
+    flatpak["remote"] = flatpak_remote()
+    flatpak["unavailable"] = []
+    if flatpak["install"]:
+        flatpak["unavailable"] = [
+            app for app in flatpak["install"] if flatpak_available(app, flatpak["remote"]) is False
+        ]
+        flatpak["install"] = [app for app in flatpak["install"] if app not in flatpak["unavailable"]]
+
+    sizes = download_sizes(backends["pacman"]["install"]) if backends["pacman"]["install"] else {}
+    backends["pacman"]["sizes"] = sizes
+    backends["pacman"]["download_size"] = sum(size or 0 for size in sizes.values())
+
+    return {
+        "muxfile": path,
+        "docs": muxfile["docs"],
+        "backends": backends,
+        "git": git,
+        "unchanged": unchanged,
+        "unknown_types": unknown,
+        # what the build needs to write the next lock file
+        "lock": {"keys": keys, "entries": entries, "checked": checked},
+    }
+
+
+def plan_has_work(plan) -> bool:
+    return any(part["install"] for part in plan["backends"].values()) or any(
+        job["run"] for job in plan["git"]
+    )
+
+
+def print_plan(plan) -> None:
+    """Show a plan the way `mux plan` does."""
+    print_color(f"Plan for {plan['muxfile']}", BLUE)
+    for backend, part in plan["backends"].items():
+        if not (part["install"] or part["skip"] or part.get("stdlib") or part.get("unavailable")):
+            continue
+        line = f"{backend:<8} install {len(part['install'])}, skip {len(part['skip'])}"
+        if backend == "pacman" and part["install"]:
+            line += f", download {format_size(part['download_size'])}"
+            missing = [name for name, size in part["sizes"].items() if size is None]
+            if missing:
+                line += f" (+{len(missing)} not in the sync databases)"
+        print(line)
+        for name in part["install"]:
+            print(f"  {paint('+', GREEN)} {name}")
+        for name in part.get("stdlib", []):
+            print(f"  = {name} (standard library)")
+        for name in part.get("unavailable", []):
+            print(f"  {paint('!', RED)} {name} (not on {part['remote']})")
+
+    for job in plan["git"]:
+        after = f" after {', '.join(job['after'])}" if job["after"] else ""
+        if job["run"]:
+            changed = " (changed upstream)" if job["changed"] else ""
+            print(f"git      {paint('run', GREEN)} {job['name']}{after}{changed}")
+        else:
+            print(f"git      skip {job['name']}")
+
+    for package_type in plan["unknown_types"]:
+        print_color(f"[skip] unknown package type '{package_type}'", YELLOW)
+    if plan["unchanged"]:
+        print_color(f"{plan['unchanged']} entries unchanged since the last build", YELLOW)
+    if not plan_has_work(plan):
+        print_color("Nothing to do", GREEN)
+
+
+def show_plan(path, as_json=False, force=False) -> int:
+    plan = plan_build(path, force=force)
+    if plan is None:
+        return 1
+    if as_json:
+        print(json.dumps({key: value for key, value in plan.items() if key != "lock"}, indent=2))
+    else:
+        print_plan(plan)
+    return 0
+
+
+SKIP_LABELS = {"pacman": "pacman package", "flatpak": "flatpak app", "pip": "pip package"}
+
+
+def wheelhouse_dir() -> str:
+    path = os.path.join(get_cache_dir(), "wheels")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def prefetch(plan, token=None, jobs=1) -> dict:
+    """
+    Download everything a build will install before installing anything, up to `jobs`
+    backends and git installers at once: pacman fills its package cache, pip a
+    wheelhouse, flatpak pulls without deploying and the installers are kept in memory.
+    Returns {backend: True if its download succeeded, "git": {entry hash: installer}}.
+    A failed download is not fatal, the install stage then fetches it itself.
+    """
+    backends = plan["backends"]
+    fetched = {"git": {}}
+
+    def fetch_job(backend):
+        manager = muxfile_manager(backend, plan)
+
+        def run() -> int:
+            cmd = get_backend(manager)["command"](manager, "download")
+            status = run_cmd(cmd + backends[backend]["install"], sudo=manager_sudo(manager))
+            fetched[backend] = status == 0
+            return status
+
+        return {"name": f"fetch:{backend}", "run": run, "after": [], "resource": backend}
+
+    fetch_jobs = [fetch_job(backend) for backend, part in backends.items() if part["install"]]
+
+    for git_job in plan["git"]:
+        if not git_job["run"]:
+            continue
+
+        def run_fetch(git_job=git_job) -> int:
+            status, entry = fetch_installer(git_job["repo"], git_job["file"], token=token)
+            if status != 200 or entry.get("type") != "file":
+                return 1
+            fetched["git"][git_job["key"]] = entry
+            return 0
+
+        fetch_jobs.append(
+            {"name": f"fetch:{git_job['name']}", "run": run_fetch, "after": [], "resource": None}
+        )
+
+    with span("phase", "prefetch"):
+        results = run_jobs(fetch_jobs, max_workers=jobs)
+    failed = [name for name, status in results.items() if status != 0]
+    if failed:
+        print_color(
+            f"[WARN] Could not prefetch {', '.join(failed)}, the install step will download it",
+            YELLOW,
+        )
+    return fetched
+
+
+def apply_muxfile(
+    path, token=None, jobs=1, assume_yes=False, force=False, prefetch_enabled=True
+) -> int:
+    """
+    Read a JSON muxFile and process pacman, pip, git packages.
+    For git entries, run handle_git().
+    The build executes the plan from plan_build(), so `mux plan` shows exactly what it does.
+    Everything is downloaded up front, all at once with more than one job, unless
+    prefetch_enabled is False.
+    Independent backends are installed by up to `jobs` concurrent workers.
+    Entries that did not change since the last build, on a system where nothing was
+    installed or removed since, are skipped using the lock file next to the muxFile
+    (unless force is set).
+    Returns the exit code of the first job that failed, or 0.
+    """
+    plan = plan_build(path, force=force, token=token)
+    if plan is None:
+        return 1
+    backends = plan["backends"]
+
+    for backend, part in backends.items():
+        for name in part["skip"]:
+            print_color(f"[skip] {SKIP_LABELS[backend]} '{name}' already installed", YELLOW)
+    for mod in backends["pip"]["stdlib"]:
+        print_color(f"[skip] '{mod}' is built-in or stdlib module, no pip install needed", YELLOW)
+    for package_type in plan["unknown_types"]:
+        print_color(f"[skip] unknown package type '{package_type}'", YELLOW)
+
+    # apps the remote doesn't offer are never tried, but still make the build fail
+    failed = list(backends["flatpak"]["unavailable"])
+    for app in failed:
+        print_color(f"[ERROR] flatpak app '{app}' is not on the {backends['flatpak']['remote']} remote", RED)
+    entries = plan["lock"]["entries"]
+    # filled in by the prefetch stage once the build is confirmed
+    fetched = {"git": {}}
+
+    def batch_job(backend, options):
+        def run() -> int:
+            manager = muxfile_manager(backend, plan)
+            failures, status = install_many(manager, backends[backend]["install"], options)
+            failed.extend(failures)
+            return status
+
+        return {"name": backend, "run": run, "after": [], "resource": backend}
+
+    def install_jobs() -> list:
+        """The install stage, which uses whatever the prefetch stage downloaded."""
+        options = {"pacman": ["--needed"], "flatpak": [], "pip": []}
+        if jobs > 1 and not unattended():
+            # pacman can't ask for confirmation without the terminal
+            options["pacman"].append("--noconfirm")
+        if fetched.get("flatpak"):
+            options["flatpak"].append("--no-pull")
+        if fetched.get("pip"):
+            options["pip"] += ["--no-index", "--find-links", wheelhouse_dir()]
+
+        # one transaction per backend, independent backends run side by side
+        install = [
+            batch_job(backend, options[backend])
+            for backend, part in backends.items()
+            if part["install"]
+        ]
+        install.extend(git_jobs)
+        return install
+
+    git_jobs = []
+    for git_job in plan["git"]:
+        if not git_job["run"]:
+            continue
+
+        def run_git(git_job=git_job) -> int:
+            entry = fetched["git"].get(git_job["key"])
+            result = handle_git(
+                git_job["repo"], git_job["file"], token=token, entry=entry,
+                timeout=git_job["timeout"],
+            )
+            if result["status"] == 0:
+                entries[git_job["key"]] = {"type": "git", "sha": result["sha"]}
+            return result["status"]
+
+        git_jobs.append({
+            "name": git_job["name"],
+            "run": run_git,
+            "after": git_job["after"],
+            # each installer runs in a process of its own, so they can run side by side
+            "resource": None,
+        })
+
+    if plan["unchanged"]:
+        print_color(f"[skip] {plan['unchanged']} entries unchanged since the last build", YELLOW)
+
+    results = {}
+    jobs_to_run = []
+    if not plan_has_work(plan):
+        print_color("[INFO] Nothing to do", GREEN)
+    elif not confirm_build(plan, assume_yes):
+        return 1
+    else:
+        if jobs > 1 and backends["pacman"]["install"] and not batch_mode():
+            # ask for the sudo password once, before the output is multiplexed
+            run_cmd(["-v"], sudo=True)
+
+        if prefetch_enabled:
+            fetched = prefetch(plan, token=token, jobs=jobs)
+        jobs_to_run = install_jobs()
+        with span("phase", "install"):
+            results = run_jobs(jobs_to_run, max_workers=jobs)
+
+    if failed:
+        print_color(f"[ERROR] Failed to install: {', '.join(failed)}", RED)
+
+    for key, item in plan["lock"]["checked"]:
+        names = entry_names(item)
+        if not any(name in failed for name in names):
+            entries[key] = {
+                "type": item["type"],
+                "versions": {name: resolved_version(item["type"], name) for name in names},
+            }
+    save_lock(path, {
+        "version": LOCK_VERSION,
+        # taken after the build, so the next one can tell whether anything changed since
+        "state": backend_states(),
+        "entries": {key: entries[key] for key in dict.fromkeys(plan["lock"]["keys"]) if key in entries},
+    })
+    return next(
+        (results[job["name"]] for job in jobs_to_run if results[job["name"]] != 0), 1 if failed else 0
+    )
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DATABASE SYNC
+# ────────────────────────────────────────────────────────────────────────────────
+
+# only these actions need up to date package databases
+REFRESH_ACTIONS = ("install", "update")
+
+
+def last_sync_time() -> float:
+    """When the package databases were last refreshed, by mux or by the package manager itself."""
+    import glob
+
+    last_sync = load_cache("sync.json").get("last_sync", 0)
+    if setting("update_command").get("name") in PACMAN_LIKE:
+        for path in glob.glob(os.path.join(setting("pacman_db_path"), "sync", "*.db")):
+            try:
+                last_sync = max(last_sync, os.stat(path).st_mtime)
+            except OSError:
+                continue
+    return last_sync
+
+
+def refresh_databases(action, refresh=None) -> None:
+    """
+    Run the configured update command before an action that needs it.
+    refresh=True always runs it, refresh=False never does, and None skips it
+    while the last sync is younger than sync_ttl seconds.
+    """
+    update_command = setting("update_command")
+    if refresh is False or action not in REFRESH_ACTIONS or not update_command:
+        return
+
+    if refresh is None:
+        age = time.time() - last_sync_time()
+        if age < setting("sync_ttl"):
+            print_color(f"[skip] package databases were refreshed {int(age // 60)} min ago", YELLOW)
+            return
+
+    with span("phase", "update_command"):
+        status = run_cmd(
+            [update_command["name"], update_command["flag"]], sudo=update_command["sudo"]
+        )
+    if status == 0:
+        save_cache("sync.json", {"last_sync": time.time()})
+        invalidate_versions()
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DAEMON
+# ────────────────────────────────────────────────────────────────────────────────
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+
+def watch_groups() -> dict:
+    """What muxd watches, grouped by the caches a change there makes stale."""
+    return {
+        "pacman": pacman_state_paths() + [os.path.join(setting("pacman_db_path"), "sync")],
+        "flatpak": flatpak_state_paths(),
+        "pip": pip_state_paths(),
+        "apt": apt_state_paths(),
+        "dnf": dnf_state_paths(),
+        "config": [os.path.dirname(get_config_path())],
+    }
+
+
+def invalidate_group(group) -> None:
+    """Drop everything muxd keeps in memory that depends on a watch group."""
+    global _config, _managers
+    # a package that was just installed may bring a package manager along
+    _which.clear()
+    _managers = None
+    if group == "config":
+        _config = None
+    else:
+        invalidate_snapshot(group)
+
+
+def start_inotify(groups) -> tuple[int, dict, dict]:
+    """
+    Watch every path of every group with inotify, through libc since the standard
+    library has no binding. Returns the inotify fd (-1 when inotify is unavailable),
+    {watch descriptor: (group, path)} and the {group: [path]} that could not be watched.
+    """
+    import ctypes
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        fd = -1
+
+    watches = {}
+    unwatched = {}
+    for group, paths in groups.items():
+        for path in paths:
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), WATCH_MASK) if fd >= 0 else -1
+            if wd >= 0:
+                watches[wd] = (group, path)
+            else:
+                unwatched.setdefault(group, []).append(path)
+    return fd, watches, unwatched
+
+
+def read_inotify(fd, watches, unwatched) -> set:
+    """Read the pending inotify events and return the groups they touched."""
+    import struct
+
+    changed = set()
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return changed
+
+    offset = 0
+    while offset + 16 <= len(data):
+        wd, mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+        offset += 16 + length
+        if wd not in watches:
+            continue
+        group, path = watches[wd]
+        changed.add(group)
+        if mask & IN_IGNORED:
+            # the path itself went away, look at it on every request from now on
+            del watches[wd]
+            unwatched.setdefault(group, []).append(path)
+    return changed
+
+
+def run_daemon_request(conn) -> None:
+    """Answer one client, relaying everything the command prints as it goes."""
+    from contextlib import redirect_stdout
+
+    class Relay:
+        def write(self, text) -> int:
+            if text:
+                conn.sendall(json.dumps({"out": text}).encode() + b"\n")
+            return len(text)
+
+        def flush(self) -> None:
+            pass
+
+    conn.settimeout(setting("search_timeout") + 5)
+    with conn:
+        try:
+            request = json.loads(conn.makefile("rb").readline())
+            with redirect_stdout(Relay()):
+                try:
+                    status = run_action(request["action"], request["args"], request["opts"])
+                except SystemExit as e:
+                    status = e.code if isinstance(e.code, int) else 1
+                except Exception as e:
+                    print_color(f"❌ muxd: {e}", RED)
+                    status = 1
+            conn.sendall(json.dumps({"status": status or 0}).encode() + b"\n")
+        except (OSError, ValueError, KeyError):
+            # the client went away or sent garbage, nothing to answer
+            pass
+
+
+def run_daemon() -> int:
+    """
+    muxd: keep the config, installed sets, version data and the search index in
+    memory and answer DAEMON_ACTIONS over a Unix socket until stopped.
+    Caches are dropped when inotify reports a change in the directories they come
+    from. Paths inotify can't watch are compared by mtime and size on every request.
+    """
+    import selectors
+    import signal
+    import socket
+
+    path = daemon_socket_path()
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print_color(f"❌ muxd is already running on {path}", RED)
+            return 1
+        except OSError:
+            # left behind by a daemon that did not shut down cleanly
+            os.remove(path)
+        finally:
+            probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(16)
+
+    fd, watches, unwatched = start_inotify(watch_groups())
+    polled = {group: content_hash(path_signature(paths)) for group, paths in unwatched.items()}
+
+    # load everything once up front so the first query is as fast as the rest
+    for backend in SNAPSHOT_SOURCES:
+        installed_set(backend)
+    if which("pacman"):
+        outdated_packages()
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ, "client")
+    if fd >= 0:
+        selector.register(fd, selectors.EVENT_READ, "inotify")
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    mode = "inotify" if watches else "polling"
+    print_color(f"muxd listening on {path} ({mode})", GREEN)
+
+    try:
+        while True:
+            for key, _ in selector.select():
+                if key.data == "inotify":
+                    for group in read_inotify(fd, watches, unwatched):
+                        invalidate_group(group)
+                    continue
+
+                conn, _ = server.accept()
+                # events that arrived together with the client must be applied before answering
+                changed = read_inotify(fd, watches, unwatched) if fd >= 0 else set()
+                for group in changed:
+                    invalidate_group(group)
+                for group, paths in unwatched.items():
+                    signature = content_hash(path_signature(paths))
+                    if polled.get(group) != signature:
+                        polled[group] = signature
+                        invalidate_group(group)
+                run_daemon_request(conn)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+        if fd >= 0:
+            os.close(fd)
+    return 0
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# MAIN ENTRYPOINT
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def main() -> None:
+    command = read_command_line(sys.argv[1:])
+    status = daemon_request(*command)
+    sys.exit(run_command(*command) if status is None else status)
+
+
+def run_command(action, args, opts) -> int:
+    """Run a command line from read_command_line in this process. Returns mux's exit code."""
+    if not action:
+        print_color("Use 'mux help' to view the full list of all the commands", RED)
+        return 1
+
+    if opts.get("batch"):
+        set_batch_mode(True, opts.get("log-dir"))
+    elif opts.get("interactive"):
+        set_batch_mode(False, opts.get("log-dir"))
+    elif opts.get("log-dir"):
+        set_batch_mode(None, opts["log-dir"])
+    if opts.get("yes"):
+        set_assume_yes(True)
+
+    if not (opts.get("profile") or opts.get("trace-file")):
+        return run_action(action, args, opts)
+
+    enable_tracing()
+    try:
+        with span("phase", action, argv=sys.argv[1:]):
+            status = run_action(action, args, opts)
+    finally:
+        if opts.get("trace-file"):
+            write_trace(opts["trace-file"], opts.get("trace-format", "jsonl"))
+        if opts.get("profile"):
+            print_profile()
+    return status
+
+
+def run_action(action, args, opts) -> int:
+    """Run a command line action and return mux's exit code."""
+    pkg = args[0] if args else ""
+
+    jobs = setting("jobs")
+    if "jobs" in opts:
+        if not str(opts["jobs"]).isdigit() or int(opts["jobs"]) < 1:
+            print_color("❌ --jobs needs a positive number.", RED)
+            sys.exit(1)
+        jobs = int(opts["jobs"])
+    if opts.get("serial"):
+        jobs = 1
+
+    if action not in SUPPORTED_ACTIONS:
+        print_color(f"Unknown action: {action}", RED)
+        print_color("Use 'mux help' to view the full list of all the commands", RED)
+        sys.exit(1)
+
+    if action == "build":
+        # If you want to specify a different file, pass as second argument
+        mux_path = "muxFile" if not pkg else pkg
+        if os.path.exists(mux_path):
+            return apply_muxfile(
+                mux_path,
+                jobs=jobs,
+                assume_yes=bool(opts.get("yes")),
+                force=bool(opts.get("force")),
+                prefetch_enabled=setting("prefetch") and not opts.get("no-prefetch"),
+            )
+        print_color(f"No muxFile found at '{mux_path}'", RED)
+        return 1
+
+    elif action == "plan":
+        mux_path = "muxFile" if not pkg else pkg
+        if not os.path.exists(mux_path):
+            print_color(f"No muxFile found at '{mux_path}'", RED)
+            return 1
+        return show_plan(mux_path, as_json=bool(opts.get("json")), force=bool(opts.get("force")))
+
+    elif action == "help":
+        help()
+
+    elif action == "config":
+        edit_config()
+
+    elif action in ["search", "find"]:
+        if not pkg:
+            print_color("❌ Please provide a package name to search.", RED)
+            sys.exit(1)
+        search_pkg(*args)
+    elif action == "download":
+        # with no path, scan the project in the current directory
+        return download_imports(pkg or ".")
+    elif action == "outdated":
+        show_outdated()
+    elif action == "installed":
+        if not pkg:
+            print_color("❌ Please provide a package name.", RED)
+            return 1
+        if is_installed(pkg):
+            print_color(f"{pkg} is installed.", GREEN)
+            return 0
+        print_color(f"{pkg} is not installed.", YELLOW)
+        return 1
+    elif action == "which-provider":
+        if not pkg:
+            print_color("❌ Please provide a package name.", RED)
+            return 1
+        return show_providers(
+            pkg, as_json=bool(opts.get("json")), refresh=bool(opts.get("refresh"))
+        )
+    elif action == "daemon":
+        return run_daemon()
+    else:
+        # install, remove, update
+        if batch_mode() and not unattended():
+            # the package manager would ask, with nobody there to answer
+            print_color(f"[ERROR] Without a terminal {action} needs --yes or --batch to proceed", RED)
+            return 1
+        refresh = None
+        if opts.get("refresh"):
+            refresh = True
+        elif opts.get("no-refresh"):
+            refresh = False
+        if len(args) > 1 or (args and opts.get("json")):
+            return perform_many(
+                action,
+                args,
+                refresh=refresh,
+                provider=opts.get("provider"),
+                assume_yes=bool(opts.get("yes")),
+                as_json=bool(opts.get("json")),
+            )
+        return perform_action(
+            action,
+            pkg,
+            refresh=refresh,
+            provider=opts.get("provider"),
+            assume_yes=bool(opts.get("yes")),
+        )
+    return 0
+
+
+def perform_action(action, pkg, refresh=None, provider=None, assume_yes=False) -> int:
+    """
+    Perform install/remove/update using available package managers.
+    install goes straight to the manager the provider index names for pkg, remove and
+    update to the one that installed it (or the one given as provider); only when no
+    manager can tell are they tried in order.
+    Returns 0 once one of them succeeds, otherwise the last exit code.
+    """
+
+    refresh_databases(action, refresh)
+    managers = available_managers()
+    if provider:
+        managers = [m for m in managers if m["name"] == provider]
+        if not managers:
+            print_color(f"❌ {provider} is not a configured package manager.", RED)
+            return 1
+
+    def already_installed(manager, name) -> int:
+        print_color(f"{name} is already installed.", YELLOW)
+        backend = get_backend(manager)
+        if "up_to_date" in backend and backend["up_to_date"](manager, name):
+            print_color(f"{name} is already up-to-date. Skipping installation.", YELLOW)
+        return 0
+
+    if pkg and action == "install":
+        manager = installed_with(pkg, managers)
+        if manager is not None:
+            return already_installed(manager, pkg)
+
+    targets = {}
+    if pkg:
+        # like remove, update goes to whichever manager installed pkg
+        routed = route_action(
+            "install" if action == "install" else "remove", pkg, managers,
+            assume_yes=assume_yes, refresh=refresh,
+        )
+        if routed is None:
+            return 1
+        managers, targets = routed
+
+    status = 1
+    for manager in managers:
+        manager_name = manager["name"]
+        backend = get_backend(manager)
+        # the app ID or package the provider index resolved pkg to
+        target = targets.get(manager_name, pkg)
+
+        print_color("=" * 60, GREEN)
+        print_color(f"Trying to {action} with {manager_name}", GREEN)
+
+        # e.g. the flatpak app pkg is the name of
+        if action == "install" and target != pkg and installed_with(target, [manager]):
+            return already_installed(manager, target)
+
+        if action == "update" and pkg and "up_to_date" in backend and is_up_to_date(target):
+            print_color(f"{target} is already up-to-date. There is nothing to do.", YELLOW)
+            return 0
+
+        # update without a package upgrades everything
+        cmd = backend["command"](manager, "upgrade" if action == "update" and not pkg else action)
+        if cmd is None:
+            print_color(f"[skip] {manager_name} can't {action} packages", YELLOW)
+            continue
+        if pkg:
+            cmd = cmd + [target]
+
+        status = run_cmd(cmd, sudo=manager_sudo(manager))
+        if status == 0:
+            print_color("=" * 60, GREEN)
+            return 0
+
+    print_color("=" * 60, GREEN)
+    print_color(
+        "❌ No supported package manager succeeded.                         :(",
+        RED,
+    )
+    return status
+
+def perform_many(action, pkgs, refresh=None, provider=None, assume_yes=False, as_json=False) -> int:
+    """
+    install/remove/update several packages at once. Every name is resolved to a package
+    manager first, then each manager runs a single command for all of its packages.
+    Ends with a result per package (as JSON with as_json, everything else then goes to
+    stderr). Returns 0 when every package succeeded, otherwise the last exit code.
+    """
+    with stdout_to_stderr(as_json):
+        refresh_databases(action, refresh)
+        managers = available_managers()
+        if provider:
+            managers = [m for m in managers if m["name"] == provider]
+            if not managers:
+                print_color(f"❌ {provider} is not a configured package manager.", RED)
+                return 1
+        if refresh is True:
+            # fetched once here rather than once per package
+            for manager in managers:
+                if "refresh" in get_backend(manager):
+                    get_backend(manager)["refresh"](manager)
+
+        results = {
+            pkg: {"package": pkg, "manager": None, "target": pkg, "result": "", "detail": ""}
+            for pkg in pkgs
+        }
+        # manager name -> packages it provides, and -> packages it may have (the AUR, ...)
+        routed: dict[str, list] = {}
+        fallback: dict[str, list] = {}
+
+        # one resolution pass over every name before anything is run
+        for pkg in pkgs:
+            result = results[pkg]
+            manager = installed_with(pkg, managers) if action == "install" else None
+            if manager is not None:
+                result.update(manager=manager["name"], result="skipped", detail="already installed")
+                continue
+            picked = route_action(
+                "install" if action == "install" else "remove", pkg, managers, assume_yes=assume_yes
+            )
+            if picked is None:
+                if action == "install":
+                    result.update(result="failed", detail="no package manager provides it")
+                else:
+                    result.update(result="failed", detail="not installed")
+                continue
+            candidates, targets = picked
+            if targets:
+                manager = candidates[0]
+                manager_name = manager["name"]
+                if action == "install" and installed_with(targets[manager_name], [manager]):
+                    result.update(
+                        manager=manager_name, target=targets[manager_name],
+                        result="skipped", detail="already installed",
+                    )
+                    continue
+                up_to_date = get_backend(manager).get("up_to_date")
+                if action == "update" and up_to_date and up_to_date(manager, targets[manager_name]):
+                    result.update(manager=manager_name, result="skipped", detail="up to date")
+                    continue
+                result.update(manager=manager_name, target=targets[manager_name])
+                routed.setdefault(manager_name, []).append(pkg)
+            else:
+                for manager in candidates:
+                    fallback.setdefault(manager["name"], []).append(pkg)
+
+        status = 0
+        for manager in managers:
+            manager_name = manager["name"]
+            for group in (routed, fallback):
+                names = [pkg for pkg in group.get(manager_name, []) if not results[pkg]["result"]]
+                if not names:
+                    continue
+                targets = [results[pkg]["target"] for pkg in names]
+                print_color("=" * 60, GREEN)
+                print_color(f"{action}: {len(names)} package(s) with {manager_name}", GREEN)
+                with span("phase", f"{action}:{manager_name}", count=len(names)):
+                    failed, batch_status = run_many(manager, action, targets)
+                status = batch_status or status
+                for pkg in names:
+                    if results[pkg]["target"] in failed:
+                        if group is routed:
+                            results[pkg].update(result="failed", detail=f"{manager_name} failed")
+                    else:
+                        results[pkg].update(manager=manager_name, result="done")
+
+        for result in results.values():
+            if not result["result"]:
+                result.update(result="failed", detail="no package manager succeeded")
+
+    failures = [r for r in results.values() if r["result"] == "failed"]
+    status = (status or 1) if failures else 0
+    if as_json:
+        report = {"action": action, "status": status, "packages": list(results.values())}
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(action, list(results.values()))
+    return status
+
+
+def print_results(action, results) -> None:
+    """The per-package summary perform_many ends with."""
+    print_color("=" * 60, GREEN)
+    width = max(len(r["package"]) for r in results)
+    marks = {
+        "done": paint("✔", GREEN),
+        "skipped": paint("=", YELLOW),
+        "failed": paint("✘", RED),
+    }
+    done = {"install": "installed", "remove": "removed", "update": "updated"}[action]
+    for r in results:
+        via = r["manager"] or "-"
+        if r["target"] != r["package"]:
+            via += f" ({r['target']})"
+        print(f"{marks[r['result']]} {r['package'].ljust(width)}  {via:<10} {r['detail'] or done}")
+    counts = {key: sum(r["result"] == key for r in results) for key in marks}
+    print_color(
+        f"{counts['done']} done, {counts['skipped']} skipped, {counts['failed']} failed",
+        RED if counts["failed"] else GREEN,
+    )
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
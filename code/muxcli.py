@@ -0,0 +1,176 @@
+"""
+What /usr/bin/mux needs before it loads mux itself (mux.py): the command line, the config
+file and the client of muxd. A query muxd answers is done without loading the rest.
+"""
+
+import json
+import os
+import sys
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CONFIG
+# ────────────────────────────────────────────────────────────────────────────────
+
+DEFAULT_SETTINGS = {
+    "PACKAGE_MANAGERS": [],
+    "update_command": {},
+    "show_warning": False,
+    "editor": "nano",
+    # more than one job runs pacman without its prompts, so parallel builds are opt-in
+    "jobs": 1,
+    "search_timeout": 10,
+    "search_index": True,
+    "pacman_conf": "/etc/pacman.conf",
+    "pacman_db_path": "/var/lib/pacman",
+    "sync_ttl": 3600,
+    "import_map": {},
+    "github_api": "https://api.github.com",
+    "http_timeout": 15,
+    "http_retries": 3,
+    # plan/build only wait this long to learn whether a git installer changed
+    "check_timeout": 3,
+    "python": "",
+    "prefetch": True,
+    "pip_index": "https://pypi.org/simple",
+    "installer_timeout": 600,
+}
+
+
+def get_config_path() -> str:
+    return os.path.join(os.path.expanduser("~/.config/mux"), "mux.conf")
+
+def load_config() -> dict:
+    path = get_config_path()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    else:
+        return {}
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+VALUE_OPTIONS = {"jobs", "trace-file", "trace-format", "log-dir", "provider"}
+
+
+def parse_args(argv) -> tuple[str, list, dict]:
+    """Split the command line into the action, its arguments and --options."""
+    args = []
+    opts = {}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith("--") and len(arg) > 2:
+            name, has_value, value = arg[2:].partition("=")
+            if name in VALUE_OPTIONS and not has_value:
+                i += 1
+                value = argv[i] if i < len(argv) else ""
+            opts[name] = value if name in VALUE_OPTIONS else True
+        elif arg == "-j":
+            i += 1
+            opts["jobs"] = argv[i] if i < len(argv) else ""
+        elif arg == "-y":
+            opts["yes"] = True
+        else:
+            args.append(arg)
+        i += 1
+
+    action = args.pop(0) if args else ""
+    return action, args, opts
+
+
+# actions that take any number of package names, "-" reading more from stdin
+MULTI_ACTIONS = ("install", "remove", "update", "search", "find")
+
+
+def expand_names(args) -> list:
+    """Replace "-" with the names on stdin (whitespace separated, # starts a comment), once each."""
+    names = []
+    for arg in args:
+        if arg == "-":
+            for line in sys.stdin:
+                names.extend(line.split("#")[0].split())
+        else:
+            names.append(arg)
+    return list(dict.fromkeys(names))
+
+
+def read_command_line(argv) -> tuple[str, list, dict]:
+    """parse_args, with "-" replaced by the names on stdin for the actions taking several."""
+    action, args, opts = parse_args(argv)
+    if action in MULTI_ACTIONS:
+        # read here, muxd can't see this process' stdin
+        args = expand_names(args)
+    return action, args, opts
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DAEMON CLIENT
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Read-only commands muxd answers from its warm caches. Everything that installs or
+# removes needs the terminal and sudo, so it always runs in the mux process itself.
+DAEMON_ACTIONS = ("search", "find", "installed", "outdated", "which-provider")
+
+
+def print_error(config, text) -> None:
+    colors = config.get("colors", {})
+    print(f"{colors.get('RED', '')}{text}{colors.get('RESET', '')}", flush=True)
+
+
+def daemon_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or f"/tmp/mux-{os.getuid()}"
+    return os.path.join(runtime_dir, "mux", "muxd.sock")
+
+
+def daemon_request(action, args, opts) -> int | None:
+    """
+    Run a command through muxd and return its exit code, or None when muxd doesn't answer
+    it (not one of DAEMON_ACTIONS, --no-daemon, --profile, --trace-file) or isn't running,
+    so the caller can run the command itself.
+    """
+    if action not in DAEMON_ACTIONS or any(
+        opts.get(name) for name in ("no-daemon", "profile", "trace-file")
+    ):
+        return None
+
+    path = daemon_socket_path()
+    try:
+        # never talk to a socket somebody else could have put there
+        if os.stat(os.path.dirname(path)).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    config = load_config()
+    with sock:
+        search_timeout = config.get("general", {}).get(
+            "search_timeout", DEFAULT_SETTINGS["search_timeout"]
+        )
+        sock.settimeout(search_timeout + 5)
+        try:
+            sock.sendall(json.dumps({"action": action, "args": args, "opts": opts}).encode() + b"\n")
+            for line in sock.makefile("rb"):
+                message = json.loads(line)
+                if "status" in message:
+                    return message["status"]
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+        except (OSError, ValueError) as e:
+            print_error(config, f"❌ Lost the connection to muxd: {e}")
+            return 1
+
+    print_error(config, "❌ muxd closed the connection without an answer")
+    return 1
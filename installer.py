@@ -3,13 +3,26 @@ from itertools import repeat
 from io import StringIO
 import os
 import stat
-import base64
 import shutil
 import requests
 import tempfile
 import pwd
 import pty
 import json
+import hashlib
+import py_compile
+from concurrent.futures import ThreadPoolExecutor
+
+RAW_URL = os.environ.get("MUX_RAW_URL", "https://raw.githubusercontent.com/Eletroman179/mux/main")
+MANIFEST_PATH = "code/SHA256SUMS"
+CHUNK_SIZE = 64 * 1024
+HTTP_TIMEOUT = float(os.environ.get("MUX_HTTP_TIMEOUT", 15))
+HTTP_RETRIES = int(os.environ.get("MUX_HTTP_RETRIES", 3))
+# where /usr/bin/mux imports the mux module from
+LIB_DIR = "/usr/lib/mux"
+
+_session = None
+_manifest = None
 
 def run_cmd(cmd, sudo=False) -> int:
     if sudo:
@@ -36,31 +49,164 @@ def get_real_user_home() -> str:
         # Not running under sudo, use current user
         return os.path.expanduser("~")
 
-def download(path: str, download_to="") -> tuple[int, str]:
-    url = f'https://api.github.com/repos/Eletroman179/mux/contents/{path}'
-    res = requests.get(url)
+def get_session() -> requests.Session:
+    """One pooled session for every download, retrying transient failures."""
+    global _session
+    if _session is None:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _session.headers["User-Agent"] = "mux-installer"
+    return _session
+
+def http_get(url: str, cache_key=None, headers=None) -> tuple[int, bytes]:
+    """
+    GET a url and return (status code, body); status 0 means the request itself failed.
+    Uses the same ETag cache layout as mux, so unchanged files are not downloaded again.
+    """
+    headers = dict(headers or {})
+    meta_path = body_path = None
+    meta = {}
+
+    if cache_key:
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        http_dir = os.path.join(cache_home, "mux", "http")
+        os.makedirs(http_dir, exist_ok=True)
+        digest = hashlib.sha256(cache_key.encode()).hexdigest()
+        meta_path = os.path.join(http_dir, f"{digest}.json")
+        body_path = os.path.join(http_dir, f"{digest}.body")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("etag") and os.path.exists(body_path):
+                headers["If-None-Match"] = meta["etag"]
+        except (OSError, ValueError):
+            meta = {}
 
-    if res.status_code == 200:
-        data = res.json()
-        content_base64 = data.get('content', '')
-        if not content_base64:
-            return (1, f"No content found for {path}")
+    try:
+        res = get_session().get(url, headers=headers, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"❌ Request to {url} failed: {e}")
+        return (0, b"")
+
+    if res.status_code == 304 and "If-None-Match" in headers:
+        with open(body_path, "rb") as f:
+            return (200, f.read())
+
+    if res.status_code == 200 and cache_key and res.headers.get("ETag"):
+        with open(body_path, "wb") as f:
+            f.write(res.content)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"key": cache_key, "etag": res.headers["ETag"]}, f)
+
+    return (res.status_code, res.content)
+
+def get_cache_dir(name: str) -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    cache_dir = os.path.join(cache_home, "mux", name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def get_manifest() -> dict:
+    """Map every published file to its SHA-256 digest, as listed in code/SHA256SUMS."""
+    global _manifest
+    if _manifest is None:
+        status_code, body = http_get(f"{RAW_URL}/{MANIFEST_PATH}", cache_key=f"Eletroman179/mux/{MANIFEST_PATH}@main")
+        if status_code != 200:
+            return {}
+        manifest = {}
+        for line in body.decode().splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                manifest[parts[1].lstrip("*")] = parts[0].lower()
+        _manifest = manifest
+    return _manifest
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fetch_to(url: str, part_path: str) -> int:
+    """
+    Stream url into part_path, resuming from whatever an earlier attempt left behind.
+    Returns the HTTP status, 0 if the request itself failed.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
 
-        content = base64.b64decode(content_base64)
+    try:
+        with get_session().get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as res:
+            if res.status_code == 416:
+                # nothing left to fetch, the part file is already complete
+                return 200
+            if res.status_code not in (200, 206):
+                return res.status_code
+
+            # a 200 means the server ignored the range and sent the whole file
+            mode = "ab" if res.status_code == 206 else "wb"
+            with open(part_path, mode) as f:
+                for chunk in res.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+            return 200
+    except requests.RequestException as e:
+        print(f"❌ Download of {url} interrupted: {e}")
+        return 0
 
-        download_to = os.path.expanduser(download_to or path)
-        parent_dir = os.path.dirname(download_to)
-        if parent_dir:
-            os.makedirs(parent_dir, exist_ok=True)
+def download(path: str, download_to="") -> tuple[int, str]:
+    expected = get_manifest().get(path)
+    if not expected:
+        return (1, f"{path} is not listed in {MANIFEST_PATH}, refusing to install it.")
+
+    # partial and finished downloads are stored by digest, so a new release never resumes an old file
+    part_path = os.path.join(get_cache_dir("downloads"), f"{expected}.part")
+
+    for _ in range(2):
+        status_code = 200
+        if not os.path.exists(part_path) or sha256_file(part_path) != expected:
+            status_code = fetch_to(f"{RAW_URL}/{path}", part_path)
+
+        if status_code == 404:
+            return (1, f'Error 404: {path} not found in repository.')
+        elif status_code == 0:
+            return (1, 'Could not reach GitHub.')
+        elif status_code != 200:
+            return (1, f'Error {status_code}: Could not fetch content.')
+
+        if sha256_file(part_path) == expected:
+            break
+
+        # corrupt or stale data, start over once from scratch
+        os.remove(part_path)
+    else:
+        return (1, f"Checksum mismatch for {path}.")
 
-        with open(download_to, 'wb') as file:
-            file.write(content)
+    download_to = os.path.expanduser(download_to or path)
+    parent_dir = os.path.dirname(download_to)
+    if parent_dir:
+        os.makedirs(parent_dir, exist_ok=True)
+    shutil.copyfile(part_path, download_to)
 
-        return (0, f'Downloaded {path} successfully to {download_to}')
-    elif res.status_code == 404:
-        return (1, f'Error 404: {path} not found in repository.')
-    else:
-        return (1, f'Error {res.status_code}: Could not fetch content.')
+    return (0, f'Downloaded {path} successfully to {download_to} (sha256 verified)')
+
+def download_all(files: dict) -> dict:
+    """Download {repo path: destination} concurrently, returning {repo path: (status, msg)}."""
+    get_manifest()
+    with ThreadPoolExecutor(max_workers=max(len(files), 1)) as pool:
+        futures = {path: pool.submit(download, path, dest) for path, dest in files.items()}
+        return {path: future.result() for path, future in futures.items()}
 
 def install_to_user_bin(script_path: str, name: str = "mux") -> tuple[int, str]:
     """
@@ -80,19 +226,23 @@ def install_to_user_bin(script_path: str, name: str = "mux") -> tuple[int, str]:
     except Exception as e:
         return (1, f"Failed to install: {e}")
 
+def install_modules(module_paths: list) -> tuple[int, str]:
+    """
+    Copies the modules /usr/bin/mux imports to LIB_DIR and compiles them there, so mux never has to.
+    """
+    try:
+        os.makedirs(LIB_DIR, exist_ok=True)
+        for module_path in module_paths:
+            target_path = os.path.join(LIB_DIR, os.path.basename(module_path))
+            shutil.copy(module_path, target_path)
+            os.chmod(target_path, 0o644)
+            py_compile.compile(target_path, doraise=True)
+        return (0, f"Installed the mux modules to {LIB_DIR}.")
+    except PermissionError:
+        return (1, "Permission denied: You need to run this script as root (use sudo).")
+    except Exception as e:
+        return (1, f"Failed to install: {e}")
 
-def download_and_install(path: str, name: str) -> tuple[int, str]:
-    with tempfile.TemporaryDirectory() as tmpdir:
-        temp_path = os.path.join(tmpdir, name)
-        status, msg = download(path, temp_path)
-        if status == 0:
-            install_status, install_msg = install_to_user_bin(temp_path, name)
-            if install_status == 0:
-                return (0, f"Installed successfully! msg: {install_msg}")
-            else:
-                return (1, install_msg)
-        else:
-            return (1, f"Download failed: {msg}")
 
 def pretty_inline_list(data, indent_level=4):
     indent = ' ' * indent_level
@@ -224,20 +374,43 @@ def prompt_uc() -> tuple[str, str, bool]:
 def main() -> int:
     usr_action = prompt_input("What type of install would you like?", ["Custom", "Default"])
     
-    status, msg = download_and_install("code/main.py", "mux")
-    if status != 0:
-        print(f"Failed to install main.py: {msg}")
-        return 1
-    else:
-        print(f"Main file downloaded successfully. msg: {msg}")
-
     # Ensure config directory exists
     config_dir = os.path.join(get_real_user_home(), ".config/mux")
     config_path = os.path.join(config_dir, "mux.conf")
     os.makedirs(config_dir, exist_ok=True)
 
-    # Attempt to download config, warn if missing
-    config_status, config_msg = download("code/config.conf", os.path.join(config_dir, "mux.conf"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        main_path = os.path.join(tmpdir, "mux")
+        modules = {f"code/{name}": os.path.join(tmpdir, name) for name in ("mux.py", "muxcli.py")}
+        results = download_all({
+            "code/main.py": main_path,
+            **modules,
+            "code/config.conf": config_path,
+        })
+
+        # the modules first, /usr/bin/mux can't run without them
+        status, msg = next(
+            (results[path] for path in modules if results[path][0] != 0), (0, "")
+        )
+        if status == 0:
+            status, msg = install_modules(list(modules.values()))
+        if status != 0:
+            print(f"Failed to install the mux modules: {msg}")
+            return 1
+        else:
+            print(f"Module downloaded successfully. msg: {msg}")
+
+        status, msg = results["code/main.py"]
+        if status == 0:
+            status, msg = install_to_user_bin(main_path, "mux")
+        if status != 0:
+            print(f"Failed to install main.py: {msg}")
+            return 1
+        else:
+            print(f"Main file downloaded successfully. msg: {msg}")
+
+    # Warn if the config is missing
+    config_status, config_msg = results["code/config.conf"]
     if config_status != 0:
         print(f"Warning: Config file missing or not downloaded: {config_msg}")
     else: